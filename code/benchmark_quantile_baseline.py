@@ -0,0 +1,196 @@
+import sys
+import time
+import hashlib
+import resource
+import argparse
+import tracemalloc
+import multiprocessing
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import quantile_baseline as qb
+
+
+# sha256 of the formatted golden forecasts, by golden case
+# (legacy: global np.random.seed, as the original per-sample implementation;
+#  seeded: --seed Generator streams; exact: exact engine)
+GOLDEN_SHA256 = {
+    "legacy": "41dc0dabebe526f56d474af34333053931c674ebada87a1ab119522adf0143b9",
+    "seeded": "1767242ded928db0c3107e2d09db801ab459b0dd803a12a59508161c6e66e923",
+    "exact": "6acfcb89ee231f3f434a7398eefc4528d1de1f67703c014ba8edd7281c470b8d",
+}
+
+GOLDEN_SEED = 2024
+GOLDEN_WEEKS = 150
+GOLDEN_LOCATIONS = 5
+GOLDEN_NSAMPLES = 10000
+HORIZON = 4
+LAST_DATE = datetime(2025, 1, 5)
+ORIGIN_DATE = "2025-01-08"
+
+
+def synthetic_truth(weeks, locations, seed):
+    """
+    Generate synthetic truth series: non negative random walks rounded as the hub rates.
+    """
+
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 10, size=(locations, weeks))
+    return np.abs(np.cumsum(steps, axis=1) + 100).round(2)
+
+
+def measure(func, *args, **kwargs):
+    """
+    Run func twice: timed without tracing, then under tracemalloc to get the peak traced allocations (MB), 
+    so that the tracing overhead does not skew the wall time.
+
+    Returns:
+    - tuple: result of the timed run and (wall time, peak allocations).
+    """
+
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, (elapsed, peak / 1024**2)
+
+
+def peak_rss():
+    """
+    Peak RSS of the current process (MB).
+    """
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def benchmark_case(weeks, locations, nsamples, engine, seed):
+    """
+    Benchmark the baseline stages on one synthetic case, summed over the locations.
+
+    The peak RSS is the one of the process running the case (see run_case), all stages included.
+    """
+
+    truth = synthetic_truth(weeks, locations, seed)
+    location_codes = [f"L{i:02d}" for i in range(locations)]
+
+    stages = {}
+
+    if engine == "exact":
+        result, stages["exact_quantiles"] = measure(lambda: [qb.exact_quantiles(truth[i], HORIZON) for i in range(locations)])
+
+    else:
+        samples, stages["quantile_baseline"] = measure(lambda: [qb.quantile_baseline(truth[i], nsamples, HORIZON, include_training=False, 
+                                                                                     rng=qb.location_rng(seed, "ILI incidence", location_codes[i], ORIGIN_DATE))
+                                                                for i in range(locations)])
+        result, stages["compute_quantiles"] = measure(lambda: [qb.compute_quantiles(location_samples) for location_samples in samples])
+
+    _, stages["format_data"] = measure(qb.format_data_locations, result, locations=location_codes,
+                                       target="ILI incidence", last_date=LAST_DATE, origin_date=ORIGIN_DATE)
+
+    case_peak_rss = peak_rss()
+
+    return [dict(weeks=weeks,
+                 locations=locations,
+                 nsamples=nsamples,
+                 stage=stage,
+                 wall_time_s=elapsed,
+                 peak_alloc_mb=peak_alloc,
+                 case_peak_rss_mb=case_peak_rss,
+                 samples_per_s=locations * nsamples / elapsed if nsamples > 0 and elapsed > 0 else np.nan)
+            for stage, (elapsed, peak_alloc) in stages.items()]
+
+
+def run_case(weeks, locations, nsamples, engine, seed):
+    """
+    Run benchmark_case in a fresh process, so that its peak RSS does not include the previous cases.
+    """
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(benchmark_case, weeks, locations, nsamples, engine=engine, seed=seed).result()
+
+
+def golden_outputs():
+    """
+    Compute the formatted forecasts of the golden cases.
+    """
+
+    truth = synthetic_truth(GOLDEN_WEEKS, GOLDEN_LOCATIONS, GOLDEN_SEED)
+    location_codes = [f"L{i:02d}" for i in range(GOLDEN_LOCATIONS)]
+
+    np.random.seed(GOLDEN_SEED)
+    legacy = [qb.compute_quantiles(qb.quantile_baseline(truth[i], GOLDEN_NSAMPLES, HORIZON, include_training=False))
+              for i in range(GOLDEN_LOCATIONS)]
+    seeded = [qb.forecast_location(truth[i], location_codes[i], "ILI incidence", ORIGIN_DATE, GOLDEN_NSAMPLES, HORIZON, seed=GOLDEN_SEED)
+              for i in range(GOLDEN_LOCATIONS)]
+    exact = [qb.forecast_location(truth[i], location_codes[i], "ILI incidence", ORIGIN_DATE, GOLDEN_NSAMPLES, HORIZON, engine="exact")
+             for i in range(GOLDEN_LOCATIONS)]
+
+    return {case: qb.format_data_locations(df_quantiles, locations=location_codes, target="ILI incidence",
+                                           last_date=LAST_DATE, origin_date=ORIGIN_DATE)
+            for case, df_quantiles in [("legacy", legacy), ("seeded", seeded), ("exact", exact)]}
+
+
+def check_golden():
+    """
+    Compare the golden forecasts with the reference hashes.
+
+    Returns:
+    - bool: True if all the golden cases match.
+    """
+
+    matching = True
+
+    for case, df_forecasts in golden_outputs().items():
+        digest = hashlib.sha256(df_forecasts.to_csv(index=False).encode("utf-8")).hexdigest()
+        status = "OK" if digest == GOLDEN_SHA256[case] else "MISMATCH"
+        matching = matching and status == "OK"
+        print (f"Golden {case}: {status} ({digest})")
+
+    return matching
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--weeks', default='100 1000')
+    parser.add_argument('--locations', default='1 60')
+    parser.add_argument('--nsamples', default='1000 100000')
+    parser.add_argument('--engine', default="sampling", choices=["sampling", "exact"])
+    parser.add_argument('--seed', default=1)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--skip_golden', action='store_true')
+
+    args = parser.parse_args(argv)
+
+    golden_ok = True
+    if not args.skip_golden:
+        golden_ok = check_golden()
+
+    # nsamples does not apply to the exact engine
+    nsamples = [0] if args.engine == "exact" else map(int, args.nsamples.split(' '))
+
+    results = []
+    for case in product(map(int, args.weeks.split(' ')), map(int, args.locations.split(' ')), nsamples):
+        results += run_case(*case, engine=args.engine, seed=int(args.seed))
+
+    df_results = pd.DataFrame(results)
+    print (df_results.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+
+    if args.output is not None:
+        df_results.to_csv(args.output, index=False)
+
+    return 0 if golden_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
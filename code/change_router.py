@@ -0,0 +1,123 @@
+import os
+import re
+import json
+
+"""
+Routing of the changed files of a commit or PR to the buckets stored in the data-storage databases.
+
+A route table is an ordered list of rules, each one a dict with:
+- bucket (str): name of the bucket of the matching paths
+- prefix (str): path prefix of the rule, or
+- pattern (str): regular expression matched at the beginning of the path
+- exclude (str, optional): paths containing this string are not matched by the rule
+
+The first matching rule wins; the paths matching no rule go to the "unknown" bucket.
+The rules are compiled in a single regular expression alternation, so every path is classified
+in one pass whatever the number of rules.
+
+The route table of a hub can be set in its hub config (default_routes_file), as {"routes": [rules]}.
+"""
+
+default_routes_file = os.path.join(os.getcwd(), "./repo/hub-config/change-routes.json")
+
+unknown_bucket = "unknown"
+
+forecast_routes = [{"bucket": "ensemble", "prefix": "model-output/respicast-hubEnsemble/"},
+                   {"bucket": "ensemble", "prefix": "model-output/respicast-quantileBaseline/"},
+                   {"bucket": "model", "prefix": "model-output"},
+                   {"bucket": "metadata", "prefix": "model-metadata"},
+                   {"bucket": "target", "prefix": "target-data", "exclude": "latest-"},
+                   {"bucket": "evaluation", "prefix": "model-evaluation", "exclude": "latest-"}]
+
+scenario_routes = [{"bucket": "model", "prefix": "model-output"},
+                   {"bucket": "metadata", "prefix": "model-metadata"},
+                   {"bucket": "target", "prefix": "target-data", "exclude": "latest-"}]
+
+
+def compile_rule(rule):
+    """
+    Regular expression of a routing rule.
+    """
+    if "prefix" in rule:
+        expr = re.escape(rule["prefix"])
+    elif "pattern" in rule:
+        expr = rule["pattern"]
+    else:
+        raise Exception(f"Invalid routing rule {rule}: prefix or pattern required\n")
+
+    if rule.get("exclude"):
+        expr = f"(?!.*{re.escape(rule['exclude'])}){expr}"
+
+    return expr
+
+
+class ChangeRouter () :
+    """
+    Classifies changed paths in buckets with a precompiled route table.
+    """
+
+    def __init__(self, routes):
+        if not routes:
+            raise Exception(f"Empty route table\n")
+
+        self.buckets = list(dict.fromkeys(rule["bucket"] for rule in routes))
+        # one named group per rule, the name of the matching group gives the bucket
+        self.rule_buckets = {f"r{i}": rule["bucket"] for i, rule in enumerate(routes)}
+        self.regex = re.compile("|".join(f"(?P<r{i}>{compile_rule(rule)})" for i, rule in enumerate(routes)))
+
+    def route (self, path):
+        """
+        Bucket of a path (unknown_bucket if no rule matches).
+        """
+        match = self.regex.match(path)
+        return self.rule_buckets[match.lastgroup] if match else unknown_bucket
+
+    def classify (self, paths):
+        """
+        Group paths in buckets, keeping their order.
+
+        Parameters:
+        - paths (list): changed paths
+
+        Returns:
+        - dict: paths by bucket, with all the buckets of the route table and unknown_bucket
+        """
+        buckets = {bucket: [] for bucket in self.buckets}
+        buckets.setdefault(unknown_bucket, [])
+
+        match = self.regex.match
+        rule_buckets = self.rule_buckets
+        for path in paths:
+            m = match(path)
+            buckets[rule_buckets[m.lastgroup] if m else unknown_bucket].append(path)
+
+        return buckets
+
+
+def load_router(default_routes, routes_file = default_routes_file):
+    """
+    Router of the hub: route table from the hub config if present, default_routes otherwise.
+
+    The buckets of the hub config table must be buckets of default_routes, the ones stored by the caller.
+
+    Parameters:
+    - default_routes (list): route table used when the hub config does not define one
+    - routes_file (str): json file with the route table of the hub
+
+    Returns:
+    - ChangeRouter: the router
+    """
+    routes = default_routes
+
+    if routes_file and os.path.exists(routes_file):
+        print (f"Loading change routes from {routes_file}")
+        with open(routes_file, 'r') as froutes:
+            routes = json.load(froutes)["routes"]
+
+        # paths routed to other buckets would be neither stored nor reported as unknown
+        known_buckets = {rule["bucket"] for rule in default_routes}
+        unknown_buckets = sorted({rule.get("bucket") for rule in routes} - known_buckets, key=str)
+        if unknown_buckets:
+            raise Exception(f"Unknown buckets {unknown_buckets} in {routes_file}, expected one of {sorted(known_buckets)}\n")
+
+    return ChangeRouter(routes)
@@ -1,37 +1,41 @@
 import json
 import os
 import argparse
-import persist_changes as stc
+import data_storage as ds
 
 
 
 
 def emptyDb(db_path):
-    empty_json = dict() 
 
     print (f"Emptying db {db_path}")
 
-    try:
-        with open(db_path, 'w') as fdb:
-            json.dump(empty_json, fdb, indent=4)
-            print ("Emptying db - done")
-    except:
-        # If the file doesn't exist, handle error
-        raise Exception(f"Error emptying json file: {db_path}\n")
+    storage = ds.get_storage(os.path.dirname(db_path))
+    storage.clear(os.path.basename(db_path))
+    print ("Emptying db - done")
+
+
+
+def retainDb(db_path, not_ingested):
+
+    print (f"Retaining not ingested files in db {db_path}")
+
+    # remove the ingested files in place
+    storage = ds.get_storage(os.path.dirname(db_path))
+    storage.retain(os.path.basename(db_path), not_ingested)
+    print ("Retaining not ingested files - done")
 
 
 
 def clearData(db_path, not_ingested):
     print (f"Clearing db {db_path}")
-    
-    emptyDb(db_path)
 
     if not_ingested:
-        print ("Not ingested files present - store changes")
+        print ("Not ingested files present - keep them")
         print (f"Not ingested list: {not_ingested}")
-        nis = ' '.join(not_ingested)
-        print (f"input for store: {nis}")
-        stc.store(nis)
+        retainDb(db_path, not_ingested)
+    else:
+        emptyDb(db_path)
 
 
 
@@ -0,0 +1,665 @@
+import os
+import re
+import json
+import fcntl
+import shutil
+import sqlite3
+import tempfile
+import argparse
+from contextlib import contextmanager
+
+"""
+Storage layer of the .github/data-storage change databases.
+
+Each database keeps the list of changed files to be ingested, in one of these layouts:
+- forecasts (changes_db.json, ensemble_db.json, projections_db.json): {team: [{"model": model, "changes": [paths]}]}
+- targets (target_db.json): {target: {"changes": [paths]}}
+- changes (metadata_db.json, evaluation_db.json): {"changes": [paths]}
+- records (import_truth_db.json): {key: record}
+
+The backend is selected by the DATA_STORAGE_BACKEND environment variable: "json" (default) reads and
+rewrites the whole json file on every update, "sqlite" keeps all the databases in indexed tables of a
+single sqlite file and only writes the changed rows. The json files of the sqlite backend are
+exported on demand (see main).
+
+The json files are written with indent=4, or compact if DATA_STORAGE_COMPACT_JSON is true. The
+compaction (see main) drops duplicate paths and superseded snapshots and writes compact json.
+"""
+
+default_storage_dir = os.path.join(os.getcwd(), "./repo/.github/data-storage")
+
+db_layouts = {"changes_db.json": "forecasts",
+              "ensemble_db.json": "forecasts",
+              "projections_db.json": "forecasts",
+              "target_db.json": "targets",
+              "metadata_db.json": "changes",
+              "evaluation_db.json": "changes",
+              "import_truth_db.json": "records"}
+
+
+compact_json = os.getenv("DATA_STORAGE_COMPACT_JSON", "false").lower() == "true"
+
+# dated snapshots: <dir>/snapshots/<YYYY-MM-DD>-<name>, superseded by a later snapshot of the same name
+snapshot_regex = re.compile(r"^(.*/snapshots/)(\d{4}-\d{2}-\d{2})-(.+)$")
+
+
+def db_layout(db):
+    """
+    Layout of a database, from its json file name (changes for unknown databases).
+    """
+    return db_layouts.get(db, "changes")
+
+
+def merge_paths(paths, new_paths):
+    """
+    Add the new paths not yet in paths, keeping the order.
+    """
+    known = set(paths)
+    for path in new_paths:
+        if path not in known:
+            paths.append(path)
+            known.add(path)
+
+    return paths
+
+
+def load_forecasts_index(json_data):
+    """
+    Index the content of a forecasts database: team -> model -> ordered set of paths 
+    (dicts with None values, to keep the order with O(1) lookups).
+    """
+    index = {}
+    for team, j_records in json_data.items():
+        team_index = index.setdefault(team, {})
+        for j_record in j_records:
+            team_index.setdefault(j_record["model"], {}).update(dict.fromkeys(j_record["changes"]))
+
+    return index
+
+
+def dump_forecasts_index(index):
+    """
+    Content of a forecasts database from its index (see load_forecasts_index).
+    """
+    return {team: [{"model": model, "changes": list(paths)} for model, paths in team_index.items()]
+            for team, team_index in index.items()}
+
+
+def compact_paths(paths, drop_superseded = True):
+    """
+    Remove the duplicate paths and, if drop_superseded, the snapshots with a later snapshot of the same 
+    name in the list, keeping the order.
+    """
+    paths = merge_paths([], paths)
+    if not drop_superseded:
+        return paths
+
+    latest = {}
+    for path in paths:
+        match = snapshot_regex.match(path)
+        if match:
+            key = (match.group(1), match.group(3))
+            latest[key] = max(latest.get(key, ""), match.group(2))
+
+    compacted = []
+    for path in paths:
+        match = snapshot_regex.match(path)
+        if not match or latest[(match.group(1), match.group(3))] == match.group(2):
+            compacted.append(path)
+
+    return compacted
+
+
+def compact_content(db, json_data, drop_superseded = True):
+    """
+    Compacted content of a database (see compact_paths), without the empty entries.
+    """
+    layout = db_layout(db)
+
+    if layout == "forecasts":
+        compacted = {}
+        for team, team_index in load_forecasts_index(json_data).items():
+            j_records = [{"model": model, "changes": compact_paths(paths, drop_superseded)} for model, paths in team_index.items()]
+            j_records = [j_record for j_record in j_records if j_record["changes"]]
+            if j_records:
+                compacted[team] = j_records
+        return compacted
+
+    if layout == "targets":
+        compacted = {target: {"changes": compact_paths(j_target["changes"], drop_superseded)} for target, j_target in json_data.items()}
+        return {target: j_target for target, j_target in compacted.items() if j_target["changes"]}
+
+    if layout == "records":
+        return dict(json_data)
+
+    paths = compact_paths(json_data.get("changes", []), drop_superseded)
+    return {"changes": paths} if paths else {}
+
+
+def retain_content(db, json_data, paths):
+    """
+    Content of a database with only the given paths (keys for records), without the empty entries.
+    """
+    keep = set(paths)
+    layout = db_layout(db)
+
+    if layout == "forecasts":
+        retained = {}
+        for team, j_records in json_data.items():
+            j_records = [{"model": j_record["model"], "changes": [path for path in j_record["changes"] if path in keep]} 
+                         for j_record in j_records]
+            j_records = [j_record for j_record in j_records if j_record["changes"]]
+            if j_records:
+                retained[team] = j_records
+        return retained
+
+    if layout == "targets":
+        retained = {target: {"changes": [path for path in j_target["changes"] if path in keep]} for target, j_target in json_data.items()}
+        return {target: j_target for target, j_target in retained.items() if j_target["changes"]}
+
+    if layout == "records":
+        return {key: record for key, record in json_data.items() if key in keep}
+
+    paths = [path for path in json_data.get("changes", []) if path in keep]
+    return {"changes": paths} if paths else {}
+
+
+def count_entries(db, json_data):
+    """
+    Number of entries of a database: stored paths, or records.
+    """
+    layout = db_layout(db)
+
+    if layout == "forecasts":
+        return sum(len(j_record["changes"]) for j_records in json_data.values() for j_record in j_records)
+
+    if layout == "targets":
+        return sum(len(j_target["changes"]) for j_target in json_data.values())
+
+    if layout == "records":
+        return len(json_data)
+
+    return len(json_data.get("changes", []))
+
+
+def group_rows(rows, n_keys):
+    """
+    Group (key_1, ..., key_n, path) rows by their keys, keeping the order of first appearance.
+
+    Returns:
+    - dict: list of paths by keys tuple.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[:n_keys]), []).append(row[n_keys])
+
+    return groups
+
+
+class JsonStorage () :
+    """
+    Databases stored as json files in storage_dir.
+
+    Files are replaced atomically (written to a temporary file, then renamed), and every 
+    read-modify-write holds an advisory lock on storage_dir, so that concurrent jobs do not 
+    lose updates. Within batch(), each database is read and written once.
+    """
+
+    def __init__(self, storage_dir = default_storage_dir):
+        self.storage_dir = storage_dir
+        self.lock_fd = None
+        self.lock_depth = 0
+        self.pending = None
+
+    def db_path (self, db):
+        return os.path.join(self.storage_dir, db)
+
+    @contextmanager
+    def locked (self):
+        """
+        Hold the exclusive lock of the storage directory (re-entrant).
+        """
+        if self.lock_depth == 0:
+            self.lock_fd = os.open(self.storage_dir, os.O_RDONLY)
+            fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+        self.lock_depth += 1
+
+        try:
+            yield
+        finally:
+            self.lock_depth -= 1
+            if self.lock_depth == 0:
+                fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+                os.close(self.lock_fd)
+                self.lock_fd = None
+
+    @contextmanager
+    def batch (self):
+        """
+        Group the updates of the block: the databases are written once, at the end of the block, 
+        and not at all if the block fails.
+        """
+        if self.pending is not None:
+            yield self
+            return
+
+        with self.locked():
+            self.pending = {}
+            try:
+                yield self
+                for db, json_data in self.pending.items():
+                    self.write(db, json_data)
+            finally:
+                self.pending = None
+
+    @contextmanager
+    def update (self, db):
+        """
+        Read-modify-write of a database, under the lock.
+        """
+        with self.locked():
+            if self.pending is not None:
+                if db not in self.pending:
+                    self.pending[db] = self.read(db)
+                yield self.pending[db]
+            else:
+                json_data = self.read(db)
+                yield json_data
+                self.write(db, json_data)
+
+    def exists (self, db):
+        return (self.pending is not None and db in self.pending) or os.path.exists(self.db_path(db))
+
+    def read (self, db):
+        if self.pending is not None and db in self.pending:
+            return self.pending[db]
+
+        json_file_path = self.db_path(db)
+
+        try:
+            with open (json_file_path, 'r') as fdb:
+                return json.load(fdb)
+        except FileNotFoundError:
+            # If the file doesn't exist, handle error
+            raise Exception(f"Json file not found {json_file_path}\n")
+
+    def write (self, db, json_data, compact = compact_json):
+        json_file_path = self.db_path(db)
+        tmp_path = None
+
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=self.storage_dir, prefix=f".{db}.", suffix=".tmp", delete=False) as fdb:
+                tmp_path = fdb.name
+                if compact:
+                    json.dump(json_data, fdb, separators=(',', ':'))
+                else:
+                    json.dump(json_data, fdb, indent=4)
+                fdb.flush()
+                os.fsync(fdb.fileno())
+
+            if os.path.exists(json_file_path):
+                shutil.copymode(json_file_path, tmp_path)
+            os.replace(tmp_path, json_file_path)
+        except:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise Exception(f"Error writing  {json_data} \n to json file: {json_file_path}\n")
+
+    def add_forecasts (self, db, rows):
+        """
+        Add (team, model, path) rows to a forecasts database.
+        """
+        with self.update(db) as json_data:
+            index = load_forecasts_index(json_data)
+
+            for team, model, path in rows:
+                index.setdefault(team, {}).setdefault(model, {})[path] = None
+
+            json_data.clear()
+            json_data.update(dump_forecasts_index(index))
+
+    def add_target_changes (self, db, rows):
+        """
+        Add (target, path) rows to a targets database.
+        """
+        with self.update(db) as json_data:
+            for (target, ), paths in group_rows(rows, 1).items():
+                merge_paths(json_data.setdefault(target, {"changes": []})["changes"], paths)
+
+    def add_changes (self, db, paths):
+        """
+        Add paths to a changes database.
+        """
+        with self.update(db) as json_data:
+            merge_paths(json_data.setdefault("changes", []), paths)
+
+    def set_records (self, db, records):
+        """
+        Insert or replace the records (dict by key) of a records database.
+        """
+        with self.update(db) as json_data:
+            json_data.update(records)
+
+    def clear (self, db):
+        with self.locked():
+            if self.pending is not None:
+                self.pending[db] = {}
+            else:
+                self.write(db, {})
+
+    def retain (self, db, paths):
+        """
+        Remove from a database all the paths but the given ones, in one read-modify-write.
+        """
+        with self.update(db) as json_data:
+            retained = retain_content(db, json_data, paths)
+            json_data.clear()
+            json_data.update(retained)
+
+    def compact (self, db, drop_superseded = True):
+        """
+        Compact a database (see compact_content) and rewrite it as compact json.
+
+        Returns:
+        - tuple: number of entries before and after the compaction
+        """
+        with self.locked():
+            json_data = self.read(db)
+            compacted = compact_content(db, json_data, drop_superseded)
+
+            if self.pending is not None:
+                self.pending[db] = compacted
+            else:
+                self.write(db, compacted, compact=True)
+
+        return count_entries(db, json_data), count_entries(db, compacted)
+
+
+class SqliteStorage () :
+    """
+    Databases stored in the tables of a single sqlite file in storage_dir.
+
+    The json content of a database is imported on its first use, if its json file exists.
+    Each update is a transaction, batch() groups several updates into one transaction.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS dbs (db TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS forecast_changes (db TEXT NOT NULL, team TEXT NOT NULL, model TEXT NOT NULL, path TEXT NOT NULL,
+                                                     PRIMARY KEY (db, team, model, path));
+        CREATE TABLE IF NOT EXISTS target_changes (db TEXT NOT NULL, target TEXT NOT NULL, path TEXT NOT NULL,
+                                                   PRIMARY KEY (db, target, path));
+        CREATE TABLE IF NOT EXISTS changes (db TEXT NOT NULL, path TEXT NOT NULL,
+                                            PRIMARY KEY (db, path));
+        CREATE TABLE IF NOT EXISTS records (db TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+                                            PRIMARY KEY (db, key));
+    """
+
+    def __init__(self, storage_dir = default_storage_dir, file_name = "data_storage.sqlite"):
+        self.storage_dir = storage_dir
+        self.connection = sqlite3.connect(os.path.join(storage_dir, file_name), timeout=60)
+        self.connection.executescript(self.schema)
+        self.depth = 0
+
+    def db_path (self, db):
+        return os.path.join(self.storage_dir, db)
+
+    @contextmanager
+    def transaction (self):
+        """
+        Run the block in a transaction (re-entrant): only the outermost level commits, or rolls back 
+        if the block fails.
+        """
+        if self.depth > 0:
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+            return
+
+        with self.connection:
+            self.depth = 1
+            try:
+                yield
+            finally:
+                self.depth = 0
+
+    @contextmanager
+    def batch (self):
+        with self.transaction():
+            yield self
+
+    def open_db (self, db):
+        """
+        Register a database, importing its json file on first use.
+        """
+        # only the first registration (in any process) imports the json file
+        registered = self.connection.execute("INSERT OR IGNORE INTO dbs (db) VALUES (?)", (db, )).rowcount == 1
+        if registered and os.path.exists(self.db_path(db)):
+            self.import_json(db, JsonStorage(self.storage_dir).read(db))
+
+    def exists (self, db):
+        """
+        Whether the database is stored, or has a json file to import.
+        """
+        registered = self.connection.execute("SELECT 1 FROM dbs WHERE db = ?", (db, )).fetchone() is not None
+        return registered or os.path.exists(self.db_path(db))
+
+    def import_json (self, db, json_data):
+        layout = db_layout(db)
+
+        if layout == "forecasts":
+            self.insert_forecasts(db, [(team, j_record["model"], path) for team, j_records in json_data.items()
+                                       for j_record in j_records for path in j_record["changes"]])
+        elif layout == "targets":
+            self.insert_target_changes(db, [(target, path) for target, j_target in json_data.items() for path in j_target["changes"]])
+        elif layout == "records":
+            self.insert_records(db, json_data)
+        else:
+            self.insert_changes(db, json_data.get("changes", []))
+
+    def insert_forecasts (self, db, rows):
+        self.connection.executemany("INSERT OR IGNORE INTO forecast_changes (db, team, model, path) VALUES (?, ?, ?, ?)",
+                                    [(db, team, model, path) for team, model, path in rows])
+
+    def insert_target_changes (self, db, rows):
+        self.connection.executemany("INSERT OR IGNORE INTO target_changes (db, target, path) VALUES (?, ?, ?)",
+                                    [(db, target, path) for target, path in rows])
+
+    def insert_changes (self, db, paths):
+        self.connection.executemany("INSERT OR IGNORE INTO changes (db, path) VALUES (?, ?)",
+                                    [(db, path) for path in paths])
+
+    def insert_records (self, db, records):
+        self.connection.executemany("INSERT OR REPLACE INTO records (db, key, value) VALUES (?, ?, ?)",
+                                    [(db, key, json.dumps(value)) for key, value in records.items()])
+
+    def read (self, db):
+        """
+        Content of a database, in its json layout.
+        """
+        with self.transaction():
+            self.open_db(db)
+
+        layout = db_layout(db)
+
+        if layout == "forecasts":
+            rows = self.connection.execute("SELECT team, model, path FROM forecast_changes WHERE db = ? ORDER BY rowid", (db, ))
+            index = {}
+            for team, model, path in rows:
+                index.setdefault(team, {}).setdefault(model, {})[path] = None
+            return dump_forecasts_index(index)
+
+        if layout == "targets":
+            rows = self.connection.execute("SELECT target, path FROM target_changes WHERE db = ? ORDER BY rowid", (db, ))
+            return {target: {"changes": paths} for (target, ), paths in group_rows(rows, 1).items()}
+
+        if layout == "records":
+            rows = self.connection.execute("SELECT key, value FROM records WHERE db = ? ORDER BY rowid", (db, ))
+            return {key: json.loads(value) for key, value in rows}
+
+        paths = [path for path, in self.connection.execute("SELECT path FROM changes WHERE db = ? ORDER BY rowid", (db, ))]
+        return {"changes": paths} if paths else {}
+
+    def add_forecasts (self, db, rows):
+        with self.transaction():
+            self.open_db(db)
+            self.insert_forecasts(db, rows)
+
+    def add_target_changes (self, db, rows):
+        with self.transaction():
+            self.open_db(db)
+            self.insert_target_changes(db, rows)
+
+    def add_changes (self, db, paths):
+        with self.transaction():
+            self.open_db(db)
+            self.insert_changes(db, paths)
+
+    def set_records (self, db, records):
+        with self.transaction():
+            self.open_db(db)
+            self.insert_records(db, records)
+
+    def clear (self, db):
+        with self.transaction():
+            self.open_db(db)
+            for table in ["forecast_changes", "target_changes", "changes", "records"]:
+                self.connection.execute(f"DELETE FROM {table} WHERE db = ?", (db, ))
+
+    def retain (self, db, paths):
+        """
+        Remove from a database all the paths but the given ones (keys for records).
+        """
+        with self.transaction():
+            self.open_db(db)
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS retained (path TEXT PRIMARY KEY)")
+            self.connection.execute("DELETE FROM retained")
+            self.connection.executemany("INSERT OR IGNORE INTO retained (path) VALUES (?)", [(path, ) for path in paths])
+
+            for table, column in [("forecast_changes", "path"), ("target_changes", "path"), ("changes", "path"), ("records", "key")]:
+                self.connection.execute(f"DELETE FROM {table} WHERE db = ? AND {column} NOT IN (SELECT path FROM retained)", (db, ))
+
+    def compact (self, db, drop_superseded = True):
+        """
+        Compact a database (see compact_content) and export it as compact json.
+
+        Returns:
+        - tuple: number of entries before and after the compaction
+        """
+        # read, clear and import in one transaction: a failure leaves the database unchanged
+        with self.batch():
+            json_data = self.read(db)
+            compacted = compact_content(db, json_data, drop_superseded)
+            self.clear(db)
+            self.import_json(db, compacted)
+
+        # only once committed
+        if self.depth == 0:
+            # give the space of the removed rows back to the file system
+            self.connection.execute("VACUUM")
+            self.export(db, compact=True)
+
+        return count_entries(db, json_data), count_entries(db, compacted)
+
+    def export (self, db, compact = compact_json):
+        """
+        Write the json file of a database.
+        """
+        json_storage = JsonStorage(self.storage_dir)
+        with json_storage.locked():
+            json_storage.write(db, self.read(db), compact)
+
+
+# storages by backend and directory, shared so that batches include all the updates of the process
+storages = {}
+
+
+def get_storage(storage_dir = default_storage_dir):
+    """
+    Storage of the backend selected by the DATA_STORAGE_BACKEND environment variable (json or sqlite).
+    """
+
+    backend = os.getenv("DATA_STORAGE_BACKEND", "json")
+    key = (backend, os.path.abspath(storage_dir))
+
+    if key not in storages:
+        if backend == "json":
+            storages[key] = JsonStorage(storage_dir)
+        elif backend == "sqlite":
+            storages[key] = SqliteStorage(storage_dir)
+        else:
+            raise Exception(f"Unknown data storage backend {backend}\n")
+
+    return storages[key]
+
+
+class ChangeStore () :
+    """
+    Stores the classified changes of a commit or PR in the data-storage databases.
+    """
+
+    def __init__(self, storage_dir = default_storage_dir):
+        self.storage = get_storage(storage_dir)
+
+    def commit (self, batch):
+        """
+        Store a batch of changes in one storage batch: each affected database is written once.
+
+        Parameters:
+        - batch (dict): rows by database, in the layout of the database: (team, model, path) for forecasts, 
+          (target, path) for targets, paths for changes and (key, record) for records.
+        """
+
+        with self.storage.batch():
+            for db, rows in batch.items():
+                if not rows:
+                    continue
+
+                print (f"Storing {len(rows)} changes in {db}")
+                layout = db_layout(db)
+
+                if layout == "forecasts":
+                    self.storage.add_forecasts(db, rows)
+                elif layout == "targets":
+                    self.storage.add_target_changes(db, rows)
+                elif layout == "records":
+                    self.storage.set_records(db, dict(rows))
+                else:
+                    self.storage.add_changes(db, rows)
+
+
+if __name__ == "__main__":
+
+    """
+    export: write the json files of the databases stored in sqlite, for the workflows reading them.
+    compact: compact the databases, reporting their size and number of entries.
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--action', default="export", choices=["export", "compact"])
+    parser.add_argument('--storage_dir', default=default_storage_dir)
+    parser.add_argument('--dbs', default=' '.join(db_layouts.keys()))
+    parser.add_argument('--keep_superseded', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.action == "export":
+        storage = SqliteStorage(args.storage_dir)
+        for db in args.dbs.split(' '):
+            print (f"Exporting {db}")
+            storage.export(db)
+
+    else:
+        storage = get_storage(args.storage_dir)
+        for db in args.dbs.split(' '):
+            if not storage.exists(db):
+                print (f"Skipping {db}: not found")
+                continue
+
+            # size of the json file (0 if not exported yet)
+            json_file_path = os.path.join(args.storage_dir, db)
+            size = os.path.getsize(json_file_path) if os.path.exists(json_file_path) else 0
+            n_entries, n_compacted = storage.compact(db, drop_superseded = not args.keep_superseded)
+            print (f"Compacted {db}: {n_entries} -> {n_compacted} entries, {size} -> {os.path.getsize(json_file_path)} bytes")
@@ -0,0 +1,249 @@
+import pandas as pd
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+
+# forecast unit: one forecast is scored for each of its combinations
+forecast_unit = ['model', 'origin_date', 'target', 'target_end_date', 'horizon', 'location']
+
+# columns of the scores summary, as written by the scoringutils summary
+summary_columns = forecast_unit + ['interval_score', 'dispersion', 'underprediction', 'overprediction',
+                                   'coverage_deviation', 'bias', 'ae_median']
+
+model_output_extensions = (".csv", ".parquet")
+
+
+def import_truth_data(hub_path, targets, subfolders, truth_snapshot=None):
+    """
+    Import the truth data of the targets from all the data sources.
+
+    Parameters:
+    - hub_path (str): hub root path.
+    - targets (list): target names, as in the truth file names (e.g. ILI_incidence).
+    - subfolders (list): truth data folders (e.g. ERVISS, FluID).
+    - truth_snapshot (str): date of the truth snapshots to use (e.g. 2024-12-06), the latest truth data if None.
+
+    Returns:
+    - pd.DataFrame: truth data with target, target_end_date, location and true_value columns.
+    """
+
+    truth_parts = []
+
+    for target in targets:
+        for subfolder in subfolders:
+            if truth_snapshot is None:
+                file_path = os.path.join(hub_path, f"target-data/{subfolder}/latest-{target}.csv")
+            else:
+                file_path = os.path.join(hub_path, f"target-data/{subfolder}/snapshots/{truth_snapshot}-{target}.csv")
+
+            df_truth = pd.read_csv(file_path)
+            df_truth = df_truth.rename(columns={"truth_date": "target_end_date", "value": "true_value"})
+            df_truth["target"] = target.replace("_", " ")
+            truth_parts.append(df_truth[["target", "target_end_date", "location", "true_value"]])
+
+    df_truth = pd.concat(truth_parts, ignore_index=True)
+    df_truth["target_end_date"] = pd.to_datetime(df_truth["target_end_date"]).dt.strftime("%Y-%m-%d")
+
+    return df_truth
+
+
+def list_model_output_files(hub_path):
+    """
+    List the model output files of the hub, grouped by origin_date.
+
+    File names follow the hub convention {origin_date}-{team}-{model}.csv (or .parquet).
+
+    Returns:
+    - dict: list of (model, file path) by origin_date.
+    """
+
+    model_output_path = os.path.join(hub_path, "model-output")
+    files = {}
+
+    for model_folder in sorted(os.listdir(model_output_path)):
+        folder_path = os.path.join(model_output_path, model_folder)
+        if not os.path.isdir(folder_path):
+            continue
+
+        for file_name in sorted(os.listdir(folder_path)):
+            file_stem, extension = os.path.splitext(file_name)
+            if extension not in model_output_extensions:
+                continue
+
+            origin_date, model = file_stem[:10], file_stem[11:]
+            files.setdefault(origin_date, []).append((model, os.path.join(folder_path, file_name)))
+
+    return files
+
+
+def read_model_output(model, file_path):
+    """
+    Read a model output file, adding the model column.
+    """
+
+    if file_path.endswith(".parquet"):
+        # dates may be stored as date types
+        df_output = pd.read_parquet(file_path)
+        df_output["origin_date"] = pd.to_datetime(df_output["origin_date"]).dt.strftime("%Y-%m-%d")
+        df_output["target_end_date"] = pd.to_datetime(df_output["target_end_date"]).dt.strftime("%Y-%m-%d")
+    else:
+        df_output = pd.read_csv(file_path, dtype={"origin_date": str, "target_end_date": str, "output_type_id": str})
+
+    df_output["model"] = model
+
+    return df_output
+
+
+def score_quantiles(df_forecasts):
+    """
+    Score quantile forecasts, one summary row per forecast unit.
+
+    Scores are the ones of scoringutils (score, then summarise_scores) with the weighted interval score:
+    the mean over the quantile levels of the interval score components of their central interval,
+    the median counted once. Each forecast must have a symmetric set of quantile levels, including the median.
+
+    Parameters:
+    - df_forecasts (pd.DataFrame): quantile forecasts with the forecast_unit columns,
+      quantile, prediction and true_value.
+
+    Returns:
+    - pd.DataFrame: scores summary.
+    """
+
+    df_forecasts = df_forecasts.assign(quantile=df_forecasts["quantile"].astype(float))
+    df_forecasts = df_forecasts.sort_values(by=forecast_unit + ["quantile"], ignore_index=True)
+
+    quantile = df_forecasts["quantile"].values.astype(float)
+    prediction = df_forecasts["prediction"].values.astype(float)
+    true_value = df_forecasts["true_value"].values.astype(float)
+
+    # forecasts are contiguous blocks of rows, sorted by quantile level
+    codes = df_forecasts.groupby(by=forecast_unit, sort=False).ngroup().values
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    sizes = np.diff(np.r_[starts, len(codes)])
+    block_start = np.repeat(starts, sizes)
+    block_size = np.repeat(sizes, sizes)
+
+    # each quantile level once per forecast (e.g. no duplicated truth or quantile rows)
+    duplicated = np.flatnonzero((codes[1:] == codes[:-1]) & np.isclose(quantile[1:], quantile[:-1]))
+    if len(duplicated) > 0:
+        unit = df_forecasts.loc[duplicated[0], forecast_unit].to_dict()
+        raise Exception(f"Forecasts must not have duplicated quantile levels: {unit}\n")
+
+    # the other bound of the central interval of each quantile level
+    partner = 2 * block_start + block_size - 1 - np.arange(len(codes))
+    if not np.allclose(quantile + quantile[partner], 1.):
+        raise Exception(f"Forecasts must have symmetric quantile levels\n")
+
+    is_median = np.isclose(quantile, 0.5)
+    if (np.add.reduceat(is_median.astype(int), starts) != 1).any():
+        raise Exception(f"Forecasts must include the median once\n")
+
+    lower = np.minimum(prediction, prediction[partner])
+    upper = np.maximum(prediction, prediction[partner])
+
+    # interval score components of the central interval of each level (weighted by alpha/2)
+    dispersion = np.minimum(quantile, 1. - quantile) * (upper - lower)
+    overprediction = np.maximum(lower - true_value, 0.)
+    underprediction = np.maximum(true_value - upper, 0.)
+    coverage_deviation = ((true_value >= lower) & (true_value <= upper)) - np.abs(1. - 2. * quantile)
+
+    # bias: from the quantile levels around the true value
+    median = np.repeat(prediction[is_median], sizes)
+    level_below = np.maximum.reduceat(np.where(prediction <= true_value, quantile, -np.inf), starts)
+    level_above = np.minimum.reduceat(np.where(prediction >= true_value, quantile, np.inf), starts)
+    median_block = median[starts]
+    true_block = true_value[starts]
+    bias = np.where(true_block == median_block, 0.,
+                    np.where(true_block < median_block,
+                             np.where(np.isinf(level_below), 1., 1. - 2. * level_below),
+                             np.where(np.isinf(level_above), -1., 1. - 2. * level_above)))
+
+    def block_mean(values):
+        return np.add.reduceat(values, starts) / sizes
+
+    df_summary = df_forecasts.loc[starts, forecast_unit].reset_index(drop=True)
+    df_summary["dispersion"] = block_mean(dispersion)
+    df_summary["underprediction"] = block_mean(underprediction)
+    df_summary["overprediction"] = block_mean(overprediction)
+    df_summary["interval_score"] = df_summary["dispersion"] + df_summary["underprediction"] + df_summary["overprediction"]
+    df_summary["coverage_deviation"] = block_mean(coverage_deviation)
+    df_summary["bias"] = bias
+    df_summary["ae_median"] = np.abs(true_block - median_block)
+
+    return df_summary[summary_columns]
+
+
+def score_origin_date(model_files, df_truth):
+    """
+    Score the forecasts of one origin_date.
+
+    Parameters:
+    - model_files (list): (model, file path) of the forecasts of the origin_date.
+    - df_truth (pd.DataFrame): truth data, as returned by import_truth_data.
+
+    Returns:
+    - pd.DataFrame: scores summary.
+    """
+
+    df_outputs = pd.concat([read_model_output(model, file_path) for model, file_path in model_files], ignore_index=True)
+
+    # keep the quantiles of the scored targets, where the true data is available
+    df_outputs = df_outputs.loc[(df_outputs.output_type != "median") & df_outputs.target.isin(df_truth.target.unique())]
+    df_outputs = df_outputs.rename(columns={"output_type_id": "quantile", "value": "prediction"})
+    df_forecasts = pd.merge(df_outputs, df_truth, on=["target", "target_end_date", "location"], how="inner")
+    df_forecasts = df_forecasts.loc[df_forecasts.true_value.notnull()]
+
+    if len(df_forecasts) == 0:
+        return pd.DataFrame(columns=summary_columns)
+
+    return score_quantiles(df_forecasts)
+
+
+def evaluate_forecasts(hub_path, targets, subfolders, truth_snapshot=None, workers=1):
+    """
+    Score all the forecasts of the hub, serially or on a pool of worker processes (one job per origin_date).
+
+    Returns:
+    - pd.DataFrame: scores summary.
+    """
+
+    df_truth = import_truth_data(hub_path, targets, subfolders, truth_snapshot)
+    files = list_model_output_files(hub_path)
+    origin_dates = sorted(files.keys())
+
+    if workers <= 1:
+        results = [score_origin_date(files[origin_date], df_truth) for origin_date in origin_dates]
+
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(score_origin_date, files[origin_date], df_truth) for origin_date in origin_dates]
+            results = [future.result() for future in futures]
+
+    return pd.concat(results, ignore_index=True)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hub_path', default="./")
+    parser.add_argument('--targets', default="ILI_incidence,ARI_incidence")
+    parser.add_argument('--subfolders', default="ERVISS,FluID")
+    parser.add_argument('--truth_snapshot', default=None)
+    parser.add_argument('--workers', default=1)
+
+    args = parser.parse_args(argv)
+
+    df_summary = evaluate_forecasts(args.hub_path,
+                                    targets=args.targets.split(","),
+                                    subfolders=args.subfolders.split(","),
+                                    truth_snapshot=args.truth_snapshot,
+                                    workers=int(args.workers))
+
+    # save
+    df_summary.to_csv(os.path.join(args.hub_path, "model-evaluation/forecast_scores_summary.csv"), index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,543 @@
 import pandas as pd 
 import numpy as np
 import argparse
+import hashlib
+import json
+import shutil
+import tempfile
 import os
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--hub_path', default="./")
-parser.add_argument('--baseline_team_abbr', default="respicast")
-parser.add_argument('--baseline_model_abbr', default="quantileBaseline")
-
-args = parser.parse_args()
 metric_names = {"interval_score": "WIS", "ae_median": "AE"}
 
-# import forecast scoring 
-df_scores = pd.read_csv(os.path.join(args.hub_path, f"model-evaluation/forecast_scores_summary.csv"))
-
-# create team_id, model_id columns
-df_scores["team_id"] = df_scores["model"].apply(lambda x : str(x).split("-")[0])
-df_scores["model_id"] = df_scores["model"].apply(lambda x : str(x).split("-")[1])
-df_scores.drop("model", inplace=True, axis=1)
-
-# cols to rows
-df_scores = pd.melt(df_scores, 
-        id_vars = ['origin_date', 'target', 'target_end_date', 'horizon', 'location', "team_id", "model_id"],
-        value_vars=['interval_score', 'dispersion', 'underprediction', 'overprediction', 'ae_median'], 
-        var_name='metric', value_name='value_absolute')
-
-# keep selected metrics and rename
-df_scores = df_scores.loc[df_scores.metric.isin(["interval_score", "ae_median"])].reset_index(drop=True)
-df_scores["metric"] = df_scores["metric"].apply(lambda x : metric_names[x])
-
-# Filter baseline data
-baseline_filter = (df_scores['team_id'] == str(args.baseline_team_abbr)) & \
-                  (df_scores['model_id'] == str(args.baseline_model_abbr))
-baseline_data = df_scores.loc[baseline_filter]
-
-# Compute relative values
-df_scores["value_relative"] = np.nan
-for index, row in df_scores.iterrows():
-   temp_baseline = baseline_data.loc[(baseline_data['origin_date'] == row['origin_date']) & \
-                                      (baseline_data['target'] == row['target']) & \
-                                      (baseline_data['target_end_date'] == row['target_end_date']) & \
-                                      (baseline_data['horizon'] == row['horizon']) & \
-                                      (baseline_data['location'] == row['location']) & \
-                                      (baseline_data['metric'] == row['metric'])]
-   if not temp_baseline.empty:
-      df_scores.at[index, 'value_relative'] = np.log2(temp_baseline['value_absolute'].values[0] / row['value_absolute'])
-      #df_scores.at[index, 'value_relative'] = 1 - row.value_absolute / temp_baseline.value_absolute.values[0]
-
-# remove rows where value relative is NaN
-df_scores = df_scores.loc[df_scores.value_relative.notnull()].reset_index(drop=True)
-
-# fix inf values 
-df_scores.loc[df_scores.value_relative == np.inf, "value_relative"] = 10.
-df_scores.loc[df_scores.value_relative == -np.inf, "value_relative"] = -10.
-
-# compute number of models 
-df_nmodels = df_scores.groupby(by=["origin_date", "target", "target_end_date", "horizon", "location", "metric"], as_index=False).model_id.nunique()
-df_nmodels.rename(columns={"model_id": "n_models"}, inplace=True)
-df_scores = pd.merge(left=df_scores, right=df_nmodels, on=["origin_date", "target", "target_end_date", "horizon", "location", "metric"], how="left")
-
-# compute rank
-df_scores["rank"] = df_scores.groupby(by=["origin_date", "target", "target_end_date", "horizon", "location", "metric"], as_index=False).value_absolute.rank(method="min")
-df_scores["rank"] = df_scores["rank"].astype(int)
-
-# compute rank_score
-forecast_rounds = df_scores[['origin_date', 'target', 'target_end_date', 
-                             'horizon', 'location', 'metric']].drop_duplicates()
-df_scores["rank_score"] = 0.0
-for index, row in forecast_rounds.iterrows():
-    temp_df = df_scores.loc[(df_scores['origin_date'] == row['origin_date']) & \
-                            (df_scores['target'] == row['target']) & \
-                            (df_scores['target_end_date'] == row['target_end_date']) & \
-                            (df_scores['horizon'] == row['horizon']) & \
-                            (df_scores['location'] == row['location']) & \
-                            (df_scores['metric'] == row['metric'])]
-    
-    max_value_rel, min_value_rel = np.max(temp_df["value_absolute"]), np.min(temp_df["value_absolute"])
-    if len(temp_df) > 1: 
-        if max_value_rel != min_value_rel:
-            df_scores.loc[temp_df.index, 'rank_score']  = temp_df["value_absolute"].apply(lambda x : (max_value_rel - x) / (max_value_rel - min_value_rel))
+# keys of a forecast round and metric
+score_keys = ['origin_date', 'target', 'target_end_date', 'horizon', 'location', 'metric']
+
+# columns of the formatted scores
+scores_columns = ['origin_date', 'target', 'target_end_date', 'horizon', 'location', 'team_id', 'model_id', 'metric', 
+                  'value_absolute', 'value_relative', 'n_models', 'rank', 'rank_score']
+
+# pairwise relative skill: the models are compared over the forecast units of the same group
+skill_group_keys = ['origin_date', 'target', 'metric']
+skill_unit_keys = ['target_end_date', 'horizon', 'location']
+skill_columns = ['relative_skill', 'scaled_relative_skill']
+
+# explicit dtypes of the scores summary read in streaming mode
+summary_dtypes = {'model': 'category', 'origin_date': str, 'target': 'category', 'target_end_date': 'category', 
+                  'horizon': 'int64', 'location': 'category'}
+
+# string columns stored dictionary-encoded and partition columns of the parquet datasets
+parquet_dictionary_columns = ['target_end_date', 'location', 'team_id', 'model_id', 'metric']
+parquet_partition_columns = ['target', 'origin_date']
+
+
+def format_scores(df_scores, baseline_team_abbr, baseline_model_abbr):
+    """
+    Format the forecast scores summary: one row per model and metric, with the values relative to 
+    the baseline, the number of models, the rank and the rank_score of each forecast round.
+
+    All the computed values only depend on the scores of the same origin_date.
+
+    Parameters:
+    - df_scores (pd.DataFrame): forecast scores summary.
+    - baseline_team_abbr (str): team of the baseline model.
+    - baseline_model_abbr (str): baseline model.
+
+    Returns:
+    - pd.DataFrame: formatted scores.
+    """
+
+    # create team_id, model_id columns (categoricals, splitting each model name once)
+    models = df_scores["model"].astype("category")
+    team_ids = pd.Categorical([str(model).split("-")[0] for model in models.cat.categories])
+    model_ids = pd.Categorical([str(model).split("-")[1] for model in models.cat.categories])
+    df_scores = df_scores.assign(team_id=team_ids.take(models.cat.codes.values), 
+                                 model_id=model_ids.take(models.cat.codes.values))
+    df_scores = df_scores.drop("model", axis=1)
+
+    # cols to rows
+    df_scores = pd.melt(df_scores, 
+            id_vars = ['origin_date', 'target', 'target_end_date', 'horizon', 'location', "team_id", "model_id"],
+            value_vars=['interval_score', 'dispersion', 'underprediction', 'overprediction', 'ae_median'], 
+            var_name='metric', value_name='value_absolute')
+
+    # keep selected metrics and rename
+    df_scores = df_scores.loc[df_scores.metric.isin(["interval_score", "ae_median"])].reset_index(drop=True)
+    df_scores["metric"] = df_scores["metric"].map(metric_names).astype("category")
+
+    # Filter baseline data
+    baseline_filter = (df_scores['team_id'] == str(baseline_team_abbr)) & \
+                      (df_scores['model_id'] == str(baseline_model_abbr))
+    baseline_data = df_scores.loc[baseline_filter]
+
+    # Compute relative values, joining each score with the baseline score of the same forecast
+    baseline_values = baseline_data.dropna(subset=score_keys).drop_duplicates(subset=score_keys)
+    baseline_values = baseline_values[score_keys + ['value_absolute']].rename(columns={'value_absolute': 'value_baseline'})
+
+    df_scores = pd.merge(left=df_scores, right=baseline_values, on=score_keys, how="left")
+    with np.errstate(divide="ignore", invalid="ignore"):
+       df_scores["value_relative"] = np.log2(df_scores["value_baseline"] / df_scores["value_absolute"])
+       #df_scores["value_relative"] = 1 - df_scores["value_absolute"] / df_scores["value_baseline"]
+    df_scores.drop("value_baseline", inplace=True, axis=1)
+
+    # remove rows where value relative is NaN
+    df_scores = df_scores.loc[df_scores.value_relative.notnull()].reset_index(drop=True)
+
+    # fix inf values 
+    df_scores.loc[df_scores.value_relative == np.inf, "value_relative"] = 10.
+    df_scores.loc[df_scores.value_relative == -np.inf, "value_relative"] = -10.
+
+    # group the scores by forecast round and metric: number of models, rank and rank_score are computed in one grouped pass
+    grouped_scores = df_scores.groupby(by=score_keys, observed=True)
+
+    # compute number of models 
+    df_scores["n_models"] = grouped_scores.model_id.transform("nunique")
+
+    # compute rank
+    df_scores["rank"] = grouped_scores.value_absolute.rank(method="min")
+    df_scores["rank"] = df_scores["rank"].astype(int)
+
+    # compute rank_score (min-max normalisation within the round, 1 if all the values are equal, 0 for single scores)
+    n_round_scores = grouped_scores.value_absolute.transform("size")
+    max_value_rel = grouped_scores.value_absolute.transform("max")
+    min_value_rel = grouped_scores.value_absolute.transform("min")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df_scores["rank_score"] = np.where(n_round_scores > 1, 
+                                           np.where(max_value_rel != min_value_rel, (max_value_rel - df_scores["value_absolute"]) / (max_value_rel - min_value_rel), 1.), 
+                                           0.)
+
+    return df_scores
+
+
+def pairwise_skill_matrix(values, available):
+    """
+    Compute the pairwise tournament relative skill of the models of one group.
+
+    The mean score ratio of models i and j is computed over the units forecasted by both:
+    theta_ij = S_ij / S_ji, with S_ij the sum of the scores of i over the units shared with j. 
+    The relative skill of i is the geometric mean of theta_ij over the models j with overlapping 
+    forecasts (including i itself).
+
+    Parameters:
+    - values (np.ndarray): scores, units x models (0 where not available).
+    - available (np.ndarray): availability mask, units x models.
+
+    Returns:
+    - np.ndarray: relative skill of each model.
+    """
+
+    # sums over the shared units of all the pairs, in one masked matrix product
+    shared_sums = values.T @ available
+    n_shared = available.T @ available
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_ratios = np.log(shared_sums) - np.log(shared_sums.T)
+
+    # pairs without shared units or with zero scores are not compared
+    compared = (n_shared > 0) & np.isfinite(log_ratios)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.exp(np.where(compared, log_ratios, 0.).sum(axis=1) / compared.sum(axis=1))
+
+
+def pairwise_relative_skill(df_scores, baseline_team_abbr, baseline_model_abbr):
+    """
+    Add the pairwise tournament relative skill of each model, by origin_date, target and metric: 
+    relative_skill, and scaled_relative_skill (relative skill divided by the baseline's one).
+    Values lower than 1 are better.
+
+    Returns:
+    - pd.DataFrame: formatted scores with the relative skill columns.
+    """
+
+    models, model_codes = np.unique(df_scores["team_id"].astype(str) + "-" + df_scores["model_id"].astype(str), return_inverse=True)
+    unit_codes = df_scores.groupby(by=skill_unit_keys, sort=False, observed=True).ngroup().values
+    scores = df_scores["value_absolute"].values.astype(float)
+    baseline = np.flatnonzero(models == f"{baseline_team_abbr}-{baseline_model_abbr}")
+
+    relative_skill = np.full(len(df_scores), np.nan)
+    scaled_relative_skill = np.full(len(df_scores), np.nan)
+
+    for positions in df_scores.groupby(by=skill_group_keys, sort=False, observed=True).indices.values():
+        group_models, group_model_codes = np.unique(model_codes[positions], return_inverse=True)
+        _, group_unit_codes = np.unique(unit_codes[positions], return_inverse=True)
+
+        # units x models matrices of the group
+        values = np.zeros((group_unit_codes.max() + 1, len(group_models)))
+        available = np.zeros_like(values)
+        values[group_unit_codes, group_model_codes] = scores[positions]
+        available[group_unit_codes, group_model_codes] = 1.
+
+        skill = pairwise_skill_matrix(values, available)
+        relative_skill[positions] = skill[group_model_codes]
+
+        group_baseline = np.flatnonzero(np.isin(group_models, baseline))
+        if len(group_baseline) > 0:
+            scaled_relative_skill[positions] = skill[group_model_codes] / skill[group_baseline[0]]
+
+    return df_scores.assign(relative_skill=relative_skill, scaled_relative_skill=scaled_relative_skill)
+
+
+def origin_date_fingerprints(df_summary):
+    """
+    Compute a fingerprint of the scores summary rows of each origin_date (independent of the rows order).
+
+    Returns:
+    - dict: fingerprint by origin_date.
+    """
+
+    row_hashes = pd.util.hash_pandas_object(df_summary, index=False)
+
+    return {str(origin_date): hashlib.sha256(np.sort(hashes.values).tobytes()).hexdigest()
+            for origin_date, hashes in row_hashes.groupby(df_summary["origin_date"].values)}
+
+
+def read_fingerprints(fingerprints_path):
+    """
+    Read the fingerprints saved by the previous run, if any.
+    """
+
+    if not os.path.exists(fingerprints_path):
+        return {}
+
+    with open(fingerprints_path, 'r') as ffp:
+        return json.load(ffp)
+
+
+def append_scores_parquet(df_scores, dataset_path):
+    """
+    Add formatted scores to a parquet dataset partitioned by target and origin_date, 
+    with dictionary-encoded string columns.
+
+    Requires pyarrow.
+    """
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df_scores, preserve_index=False)
+    for column in parquet_dictionary_columns:
+        position = table.schema.get_field_index(column)
+        table = table.set_column(position, column, table.column(column).cast(pa.string()).dictionary_encode())
+
+    pq.write_to_dataset(table, root_path=dataset_path, partition_cols=parquet_partition_columns)
+
+
+def replace_dataset(tmp_path, dataset_path):
+    """
+    Replace the dataset at dataset_path (if any) with the one written at tmp_path.
+
+    The current dataset is renamed aside before the new one is moved in, and deleted only afterwards: 
+    a failure at any step leaves a complete dataset, at dataset_path or aside.
+    """
+
+    old_path = f"{dataset_path.rstrip(os.sep)}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    if os.path.exists(dataset_path):
+        os.replace(dataset_path, old_path)
+    os.replace(tmp_path, dataset_path)
+
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def write_scores_parquet(df_scores, dataset_path):
+    """
+    Write the formatted scores as a parquet dataset (see append_scores_parquet). 
+    An existing dataset at dataset_path is replaced.
+    """
+
+    # write next to the current dataset and swap, so readers never see a partial dataset
+    tmp_path = f"{dataset_path.rstrip(os.sep)}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    append_scores_parquet(df_scores, tmp_path)
+
+    replace_dataset(tmp_path, dataset_path)
+
+
+def read_scores(scores_path, columns=None, filters=None):
+    """
+    Read formatted scores from a CSV file or from a parquet dataset (a folder).
+
+    Parquet datasets are read with pyarrow, loading only the requested columns and the 
+    partitions matching the filters (e.g. [("target", "=", "ILI incidence")]). Filters are 
+    not supported for CSV files.
+
+    Returns:
+    - pd.DataFrame: formatted scores, with columns in the scores_columns order.
+    """
+
+    if not os.path.isdir(scores_path):
+        if filters is not None:
+            raise Exception(f"Filters are only supported for parquet datasets: {scores_path}\n")
+        return pd.read_csv(scores_path, usecols=columns, float_precision="round_trip")
+
+    import pyarrow.parquet as pq
+
+    df_scores = pq.read_table(scores_path, columns=columns, filters=filters).to_pandas()
+
+    # dictionary-encoded and partition columns are read back as categories, the latter as the last columns
+    df_scores = df_scores[[column for column in scores_columns + skill_columns if column in df_scores.columns]]
+    categorical_columns = df_scores.select_dtypes("category").columns
+
+    return df_scores.astype({column: str for column in categorical_columns})
+
+
+def format_scores_incremental(df_summary, previous_scores_path, previous_fingerprints, baseline_team_abbr, baseline_model_abbr):
+    """
+    Format the scores of the new or changed origin_dates only, reusing the previous formatted scores for the others.
+
+    The result has the same rows as format_scores on the whole summary, ordered by origin_date.
+
+    Returns:
+    - tuple: formatted scores and fingerprints of the summary.
+    """
+
+    fingerprints = origin_date_fingerprints(df_summary)
+    baseline = f"{baseline_team_abbr}-{baseline_model_abbr}"
+
+    if previous_fingerprints.get("baseline") != baseline or not os.path.exists(previous_scores_path):
+        previous_fingerprints = {}
+
+    previous_dates = previous_fingerprints.get("origin_dates", {})
+    changed_dates = [origin_date for origin_date, fingerprint in fingerprints.items() 
+                     if previous_dates.get(origin_date) != fingerprint]
+    print (f"Incremental formatting: {len(changed_dates)} of {len(fingerprints)} origin dates new or changed")
+
+    df_parts = []
+
+    if len(changed_dates) < len(fingerprints):
+        # keep the previous rows of the unchanged origin_dates
+        df_previous = read_scores(previous_scores_path)
+        unchanged = df_previous.origin_date.astype(str).isin(fingerprints.keys()) & ~df_previous.origin_date.astype(str).isin(changed_dates)
+        df_parts.append(df_previous.loc[unchanged])
+
+    if changed_dates:
+        df_changed = df_summary.loc[df_summary.origin_date.astype(str).isin(changed_dates)].reset_index(drop=True)
+        df_parts.append(format_scores(df_changed, baseline_team_abbr, baseline_model_abbr))
+
+    df_scores = pd.concat(df_parts, ignore_index=True)
+    df_scores = df_scores.sort_values(by="origin_date", kind="stable", ignore_index=True)
+
+    return df_scores, {"baseline": baseline, "origin_dates": fingerprints}
+
+
+def spill_partitions(csv_path, spill_dir, prefix, chunksize, **read_kwargs):
+    """
+    Split a CSV file into one CSV file per origin_date, reading it in chunks of chunksize rows.
+
+    Floats are written back with full precision: the partitions are read with float_precision="round_trip" 
+    to get the same values as read from csv_path.
+
+    Returns:
+    - dict: partition file path by origin_date.
+    """
+
+    partition_paths = {}
+
+    for df_chunk in pd.read_csv(csv_path, chunksize=chunksize, **read_kwargs):
+        for origin_date, df_partition in df_chunk.groupby("origin_date", sort=False, observed=True):
+            partition_path = os.path.join(spill_dir, f"{prefix}{origin_date}.csv")
+            df_partition.to_csv(partition_path, mode="a", header=str(origin_date) not in partition_paths, index=False)
+            partition_paths[str(origin_date)] = partition_path
+
+    return partition_paths
+
+
+def format_scores_partitions(summary_path, previous_scores_path, previous_fingerprints, baseline_team_abbr, baseline_model_abbr, 
+                             chunksize=500000):
+    """
+    Format the scores summary one origin_date at a time, in origin_date order, keeping memory bounded 
+    by the size of the largest origin_date.
+
+    The summary is read in chunks with explicit dtypes (see summary_dtypes) and split by origin_date into 
+    temporary files. If previous_scores_path is given, the previous formatted scores of the unchanged 
+    origin_dates are reused, as in format_scores_incremental.
+
+    Yields:
+    - tuple: origin_date, formatted scores and fingerprint of the origin_date.
+    """
+
+    baseline = f"{baseline_team_abbr}-{baseline_model_abbr}"
+
+    if previous_scores_path is None or previous_fingerprints.get("baseline") != baseline or not os.path.exists(previous_scores_path):
+        previous_scores_path, previous_fingerprints = None, {}
+
+    previous_dates = previous_fingerprints.get("origin_dates", {})
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        summary_partitions = spill_partitions(summary_path, spill_dir, "summary-", chunksize, dtype=summary_dtypes)
+
+        previous_partitions = {}
+        if previous_scores_path is not None and not os.path.isdir(previous_scores_path):
+            previous_partitions = spill_partitions(previous_scores_path, spill_dir, "previous-", chunksize, 
+                                                   dtype={"origin_date": str}, float_precision="round_trip")
+
+        for origin_date in sorted(summary_partitions.keys()):
+            df_summary = pd.read_csv(summary_partitions[origin_date], dtype=summary_dtypes, float_precision="round_trip")
+            fingerprint = origin_date_fingerprints(df_summary)[origin_date]
+
+            if previous_scores_path is None or previous_dates.get(origin_date) != fingerprint:
+                df_scores = format_scores(df_summary, baseline_team_abbr, baseline_model_abbr)
+            elif origin_date in previous_partitions:
+                df_scores = pd.read_csv(previous_partitions[origin_date], float_precision="round_trip")
+            elif os.path.isdir(previous_scores_path):
+                df_scores = read_scores(previous_scores_path, filters=[("origin_date", "=", origin_date)])
+            else:
+                df_scores = pd.DataFrame(columns=scores_columns)
+
+            yield origin_date, df_scores, fingerprint
+
+
+def write_scores_streaming(partitions, csv_path, parquet_path, pairwise_skill, baseline_team_abbr, baseline_model_abbr):
+    """
+    Write the formatted scores partitions, as yielded by format_scores_partitions, to a CSV file and/or 
+    a parquet dataset (None to skip one). The outputs are replaced once all the partitions are written; 
+    without scores, the CSV file only has the header and the parquet dataset is not written.
+
+    Returns:
+    - tuple: max origin_date with scores and fingerprints by origin_date.
+    """
+
+    tmp_csv_path = None if csv_path is None else f"{csv_path}.tmp"
+    tmp_parquet_path = None if parquet_path is None else f"{parquet_path.rstrip(os.sep)}.tmp"
+
+    if tmp_csv_path is not None and os.path.exists(tmp_csv_path):
+        os.remove(tmp_csv_path)
+    if tmp_parquet_path is not None:
+        shutil.rmtree(tmp_parquet_path, ignore_errors=True)
+
+    fingerprints = {}
+    max_origin_date = None
+
+    for origin_date, df_scores, fingerprint in partitions:
+        fingerprints[origin_date] = fingerprint
+        if len(df_scores) == 0:
+            continue
+
+        if pairwise_skill:
+            df_scores = pairwise_relative_skill(df_scores, baseline_team_abbr, baseline_model_abbr)[scores_columns + skill_columns]
         else:
-            df_scores.loc[temp_df.index, 'rank_score'] = 1.
-        #df_scores.loc[temp_df.index, 'rank_score']  = temp_df["value_absolute"].apply(lambda x : (max_value_rel - x) / (max_value_rel - min_value_rel))
-
-# save 
-max_origin_date = df_scores.origin_date.max()
-df_scores.to_csv(os.path.join(args.hub_path, f"model-evaluation/latest-forecast_scores.csv"), index=False)
-df_scores.to_csv(os.path.join(args.hub_path, f"model-evaluation/snapshots/{max_origin_date}-forecast_scores.csv"), index=False)
-
-env_file = os.getenv('GITHUB_OUTPUT')
-with open(env_file, "a") as outenv:
-   outenv.write (f"scoring_file_latest=model-evaluation/latest-forecast_scores.csv\n")
-   outenv.write (f"scoring_file_snapshot=model-evaluation/snapshots/{max_origin_date}-forecast_scores.csv")
-        
+            df_scores = df_scores[scores_columns]
+
+        if tmp_csv_path is not None:
+            df_scores.to_csv(tmp_csv_path, mode="a", header=max_origin_date is None, index=False)
+        if tmp_parquet_path is not None:
+            append_scores_parquet(df_scores, tmp_parquet_path)
+
+        # partitions come in origin_date order
+        max_origin_date = origin_date
+
+    if tmp_csv_path is not None:
+        if max_origin_date is None:
+            # no scores: header only, as in full mode
+            pd.DataFrame(columns=scores_columns + (skill_columns if pairwise_skill else [])).to_csv(tmp_csv_path, index=False)
+        os.replace(tmp_csv_path, csv_path)
+    if tmp_parquet_path is not None and max_origin_date is not None:
+        replace_dataset(tmp_parquet_path, parquet_path)
+
+    return max_origin_date, fingerprints
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hub_path', default="./")
+    parser.add_argument('--baseline_team_abbr', default="respicast")
+    parser.add_argument('--baseline_model_abbr', default="quantileBaseline")
+    parser.add_argument('--incremental', action='store_true')
+    parser.add_argument('--output_format', default="csv", choices=["csv", "parquet", "both"])
+    parser.add_argument('--pairwise_skill', action='store_true')
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--chunksize', default=500000)
+
+    args = parser.parse_args(argv)
+
+    write_csv = args.output_format in ["csv", "both"]
+    write_parquet = args.output_format in ["parquet", "both"]
+
+    latest_path = os.path.join(args.hub_path, f"model-evaluation/latest-forecast_scores.csv")
+    latest_parquet_path = os.path.join(args.hub_path, f"model-evaluation/latest-forecast_scores")
+    fingerprints_path = os.path.join(args.hub_path, f"model-evaluation/latest-forecast_scores_fingerprints.json")
+    summary_path = os.path.join(args.hub_path, f"model-evaluation/forecast_scores_summary.csv")
+    baseline = f"{args.baseline_team_abbr}-{args.baseline_model_abbr}"
+
+    if args.streaming:
+        # format and save one origin_date at a time, the snapshots are copies of the latest outputs
+        partitions = format_scores_partitions(summary_path, 
+                                              previous_scores_path=(latest_path if write_csv else latest_parquet_path) if args.incremental else None, 
+                                              previous_fingerprints=read_fingerprints(fingerprints_path) if args.incremental else {}, 
+                                              baseline_team_abbr=args.baseline_team_abbr, 
+                                              baseline_model_abbr=args.baseline_model_abbr, 
+                                              chunksize=int(args.chunksize))
+        max_origin_date, origin_fingerprints = write_scores_streaming(partitions, 
+                                                                      csv_path=latest_path if write_csv else None, 
+                                                                      parquet_path=latest_parquet_path if write_parquet else None, 
+                                                                      pairwise_skill=args.pairwise_skill, 
+                                                                      baseline_team_abbr=args.baseline_team_abbr, 
+                                                                      baseline_model_abbr=args.baseline_model_abbr)
+        fingerprints = {"baseline": baseline, "origin_dates": origin_fingerprints}
+        has_scores = max_origin_date is not None
+
+        if write_csv and has_scores:
+            shutil.copyfile(latest_path, os.path.join(args.hub_path, f"model-evaluation/snapshots/{max_origin_date}-forecast_scores.csv"))
+        if write_parquet and has_scores:
+            snapshot_parquet_path = os.path.join(args.hub_path, f"model-evaluation/snapshots/{max_origin_date}-forecast_scores")
+            shutil.rmtree(snapshot_parquet_path, ignore_errors=True)
+            shutil.copytree(latest_parquet_path, snapshot_parquet_path)
+
+    else:
+        # import forecast scoring 
+        df_summary = pd.read_csv(summary_path)
+
+        if args.incremental:
+            df_scores, fingerprints = format_scores_incremental(df_summary, 
+                                                                previous_scores_path=latest_path if write_csv else latest_parquet_path, 
+                                                                previous_fingerprints=read_fingerprints(fingerprints_path), 
+                                                                baseline_team_abbr=args.baseline_team_abbr, 
+                                                                baseline_model_abbr=args.baseline_model_abbr)
+        else:
+            df_scores = format_scores(df_summary, args.baseline_team_abbr, args.baseline_model_abbr)
+
+        # pairwise relative skill (recomputed on all the rows, it is cheap with respect to the formatting)
+        if args.pairwise_skill:
+            df_scores = pairwise_relative_skill(df_scores, args.baseline_team_abbr, args.baseline_model_abbr)
+        else:
+            df_scores = df_scores.drop(columns=skill_columns, errors="ignore")
+
+        # save 
+        max_origin_date = df_scores.origin_date.max()
+        has_scores = len(df_scores) > 0
+
+        if write_csv:
+            df_scores.to_csv(latest_path, index=False)
+            if has_scores:
+                df_scores.to_csv(os.path.join(args.hub_path, f"model-evaluation/snapshots/{max_origin_date}-forecast_scores.csv"), index=False)
+
+        if write_parquet and has_scores:
+            write_scores_parquet(df_scores, latest_parquet_path)
+            write_scores_parquet(df_scores, os.path.join(args.hub_path, f"model-evaluation/snapshots/{max_origin_date}-forecast_scores"))
+
+    # without scores there are no snapshots and no parquet dataset
+    if not has_scores:
+        print ("No scores to format")
+
+    outputs = []
+    if write_csv:
+        outputs.append(f"scoring_file_latest=model-evaluation/latest-forecast_scores.csv")
+        if has_scores:
+            outputs.append(f"scoring_file_snapshot=model-evaluation/snapshots/{max_origin_date}-forecast_scores.csv")
+    if write_parquet and has_scores:
+        outputs.append(f"scoring_parquet_latest=model-evaluation/latest-forecast_scores")
+        outputs.append(f"scoring_parquet_snapshot=model-evaluation/snapshots/{max_origin_date}-forecast_scores")
+
+    # fingerprints of the formatted summary, for the next incremental run
+    if args.incremental:
+        with open(fingerprints_path, 'w') as ffp:
+            json.dump(fingerprints, ffp, indent=4)
+
+    env_file = os.getenv('GITHUB_OUTPUT')
+    with open(env_file, "a") as outenv:
+       outenv.write ("\n".join(outputs))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,54 @@
 import pandas as pd 
 import numpy as np 
 import os 
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta, datetime
 import argparse
 
 # list of ground truth data sources
 data_sources = ["ERVISS", "FluID"]
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--hub_path')
-parser.add_argument('--targets', default= 'ILI_incidence ARI_incidence')
-parser.add_argument('--symmetrize', default=True)
-parser.add_argument('--nsamples', default=10000)
-parser.add_argument('--horizon', default=4)
-parser.add_argument('--team_abbr', default="respicast")
-parser.add_argument('--model_abbr', default="quantileBaseline")
-parser.add_argument('--submission_end_weekday', default=2)
-
-args = parser.parse_args()
-
-targets = args.targets.split(' ')
-
 
 def import_forecasting_weeks(path): 
-    forecasting_weeks = pd.read_csv(f"./{path}/supporting-files/forecasting_weeks.csv")
+    forecasting_weeks = pd.read_csv(os.path.join(path, "supporting-files/forecasting_weeks.csv"))
     forecasting_weeks = forecasting_weeks.loc[(forecasting_weeks.is_latest == True) & (forecasting_weeks.horizon.isin([1,2,3,4]))]
     return forecasting_weeks
+
+
+def location_rng(seed : int, 
+                 target : str, 
+                 location : str, 
+                 origin_date : str) -> np.random.Generator:
+    """
+    Build the random generator used for one (target, location, origin_date) forecast.
+
+    The stream is spawned from the global seed with a key derived from the forecast
+    identifiers only, so it does not depend on the order in which locations are processed.
+
+    Parameters:
+    - seed (int): global seed of the run.
+    - target (str): target name.
+    - location (str): location code.
+    - origin_date (str): forecast origin date.
+
+    Returns:
+    - np.random.Generator: independent generator for the forecast.
+    """
+
+    spawn_key = tuple(int.from_bytes(hashlib.sha256(str(k).encode("utf-8")).digest()[:4], "little") 
+                      for k in (target, location, origin_date))
+    
+    return np.random.default_rng(np.random.SeedSequence(entropy=seed, spawn_key=spawn_key))
     
 
 def quantile_baseline(data : np.ndarray, 
                       nsamples : int, 
                       horizon : int, 
                       symmetrize : bool = True, 
-                      include_training : bool = True) -> np.ndarray:
+                      include_training : bool = True, 
+                      rng : np.random.Generator = None) -> np.ndarray:
     
     """
     Compute baseline forecasts
@@ -43,13 +59,14 @@ def quantile_baseline(data : np.ndarray,
     - horizon (int): forecasting horizon in steps 
     - symmetrize (bool): if True one-step differences are symmetrized. (Defaults to True).
     - include_training (bool): if True includes also training data in returned array. (Defaults to True).
+    - rng (np.random.Generator): random generator to draw from. If None the global numpy random state is used. (Defaults to None).
 
     Returns:
     -  np.ndarray: forecast samples.
     """
 
     # compute one step changes 
-    diffs = np.diff(data)
+    diffs = np.diff(np.asarray(data, dtype=float))
 
     if symmetrize  == True: 
         diffs = np.concatenate((diffs, -diffs))
@@ -57,25 +74,46 @@ def quantile_baseline(data : np.ndarray,
     # resample forecasts
     if include_training == True:
         forecast_samples = np.zeros((nsamples, len(data) + horizon))
+        forecast_samples[:, :len(data)] = data
     else:
         forecast_samples = np.zeros((nsamples, horizon))
 
-    for i in range(nsamples): 
-        sampled_diffs = diffs[np.random.randint(0, len(diffs), size=horizon)]
-        forecasts = np.cumsum(sampled_diffs)
-        forecasts += data[-1]
+    # draw all the (nsamples, horizon) indices at once: the draws are taken
+    # in the same row-major order as sampling one path at a time
+    if rng is None:
+        sampled_idx = np.random.randint(0, len(diffs), size=(nsamples, horizon))
+    else:
+        sampled_idx = rng.integers(0, len(diffs), size=(nsamples, horizon))
 
-        # fix negative values
-        forecasts[forecasts<0] = 0 
+    # accumulate the sampled paths directly in the output array
+    forecasts = forecast_samples[:, -horizon:]
+    np.take(diffs, sampled_idx, out=forecasts)
+    np.cumsum(forecasts, axis=1, out=forecasts)
+    forecasts += data[-1]
 
-        if include_training:
-            forecast_samples[i] = np.concatenate((data, forecasts))
-        else:
-            forecast_samples[i] = forecasts
+    # fix negative values
+    np.clip(forecasts, 0, None, out=forecasts)
 
     return forecast_samples
 
 
+def quantile_columns(quantiles : np.ndarray) -> tuple:
+    """
+    Get the quantile levels and the column names of the quantiles table.
+
+    Parameters:
+    - quantiles (np.ndarray): Array of quantiles to compute.
+
+    Returns:
+    - tuple: rounded quantile levels and column names, including the additional quantiles and aggregated measures.
+    """
+
+    levels = np.round(quantiles, 2)
+    columns = [str(q) for q in levels] + ["0.025", "0.975", "min", "max"]
+
+    return levels, columns
+
+
 def compute_quantiles(samples : np.ndarray, 
                       quantiles: np.ndarray = np.arange(0.01, 1.0, 0.01)) -> pd.DataFrame:
     """
@@ -89,19 +127,117 @@ def compute_quantiles(samples : np.ndarray,
     - pd.DataFrame: DataFrame containing the computed quantiles and aggregated measures.
     """
 
-    df_samples = pd.DataFrame() 
-    for q in quantiles:
-        df_samples[str(np.round(q, 2))] = np.quantile(samples, axis=0, q=np.round(q, 2))
-    
-    # additional quantiles and aggregated measures
-    df_samples["0.025"] = np.quantile(samples, axis=0, q=0.025)
-    df_samples["0.975"] = np.quantile(samples, axis=0, q=0.975)
-    df_samples["min"] = np.min(samples, axis=0)
-    df_samples["max"] = np.max(samples, axis=0)
+    levels, columns = quantile_columns(quantiles)
+
+    # gather all the quantile levels in a single pass over the samples, 
+    # including the additional quantiles and the aggregated measures (min and max are the 0 and 1 quantiles)
+    values = np.quantile(samples, axis=0, q=np.concatenate((levels, [0.025, 0.975, 0., 1.])))
+
+    df_samples = pd.DataFrame(values.T, columns=columns)
 
     return df_samples
 
 
+def diffs_lattice(diffs : np.ndarray, 
+                  max_bins : int) -> tuple:
+    """
+    Express one-step differences as integer multiples of a common step.
+
+    The step is the finest decimal grid the differences lie on (reduced by their greatest common divisor). 
+    If that grid spans more than max_bins points, the differences are binned on a coarser grid of max_bins points.
+
+    Parameters:
+    - diffs (np.ndarray): one-step differences.
+    - max_bins (int): maximum number of grid points spanned by the differences.
+
+    Returns:
+    - tuple: integer units of the differences and grid step.
+    """
+
+    for decimals in range(7):
+        scaled = diffs * 10**decimals
+        units = np.rint(scaled)
+        if np.allclose(units, scaled, rtol=0, atol=1e-6):
+            break
+    units = units.astype(np.int64)
+    step = 10.**-decimals
+
+    # (the gcd of all-zero differences, of a constant series, is 0: keep the decimal step)
+    gcd = np.gcd.reduce(units)
+    if gcd > 1:
+        units = units // gcd
+        step = step * gcd
+
+    if units.max() - units.min() + 1 > max_bins:
+        step = (diffs.max() - diffs.min()) / (max_bins - 1)
+        units = np.rint(diffs / step).astype(np.int64)
+
+    return units, step
+
+
+def exact_quantiles(data : np.ndarray, 
+                    horizon : int, 
+                    symmetrize : bool = True, 
+                    quantiles : np.ndarray = np.arange(0.01, 1.0, 0.01), 
+                    max_bins : int = 1001) -> pd.DataFrame:
+    """
+    Compute baseline quantiles from the exact forecast distribution, without sampling.
+
+    The forecast at step h is the last value plus the sum of h one-step differences drawn from their 
+    empirical distribution, clipped at zero. Its distribution is computed by repeated discrete convolution 
+    of the histogram of the differences (see diffs_lattice for the histogram grid).
+
+    Parameters:
+    - data (np.ndarray): training data 
+    - horizon (int): forecasting horizon in steps 
+    - symmetrize (bool): if True one-step differences are symmetrized. (Defaults to True).
+    - quantiles (np.ndarray): Array of quantiles to compute. Default is np.arange(0.01, 1.0, 0.01).
+    - max_bins (int): maximum number of points of the differences histogram. (Defaults to 1001).
+
+    Returns:
+    - pd.DataFrame: DataFrame with one row per step, with the same columns as compute_quantiles.
+    """
+
+    # compute one step changes 
+    diffs = np.diff(np.asarray(data, dtype=float))
+
+    if symmetrize  == True: 
+        diffs = np.concatenate((diffs, -diffs))
+
+    levels, columns = quantile_columns(quantiles)
+
+    # missing truth values: all the quantiles are NaN, as with sampling
+    if np.isnan(diffs).any() or np.isnan(data[-1]):
+        return pd.DataFrame(np.full((horizon, len(columns)), np.nan), columns=columns)
+
+    # histogram of the differences on the integer grid
+    units, step = diffs_lattice(diffs, max_bins)
+    min_unit = units.min()
+    pmf_diffs = np.bincount(units - min_unit) / len(units)
+
+    levels = np.concatenate((levels, [0.025, 0.975]))
+
+    quantile_values = np.zeros((horizon, len(columns)))
+    pmf = np.ones(1)
+
+    for h in range(horizon):
+        # distribution of the sum of h + 1 differences
+        pmf = np.convolve(pmf, pmf_diffs)
+        values = data[-1] + ((h + 1) * min_unit + np.arange(len(pmf))) * step
+
+        # smallest value whose cumulative probability reaches each level (tolerating rounding errors)
+        cdf = np.cumsum(pmf)
+        idx = np.minimum(np.searchsorted(cdf, levels - 1e-12), len(pmf) - 1)
+        support = np.flatnonzero(pmf)
+
+        quantile_values[h] = np.concatenate((values[idx], values[[support[0], support[-1]]]))
+
+    # fix negative values
+    np.clip(quantile_values, 0, None, out=quantile_values)
+
+    return pd.DataFrame(quantile_values, columns=columns)
+
+
 def format_data(df_quantile, 
                 location, 
                 target,
@@ -110,47 +246,136 @@ def format_data(df_quantile,
                 quantiles=[0.010, 0.025, 0.050, 0.100, 0.150, 0.200, 0.250, 0.300, 0.350, 0.400, 0.450, 0.500, 
                            0.550, 0.600, 0.650, 0.700, 0.750, 0.800, 0.850, 0.900, 0.950, 0.975, 0.990]):
     
-    data_formatted = dict(origin_date=[],
-                        target=[],
-                        horizon=[],
-                        target_end_date=[],
-                        location=[],
-                        output_type=[],
-                        output_type_id=[],
-                        value=[])
-
-    for index, row in df_quantile.iterrows(): 
-        # add quantiles
-        for quantile in quantiles: 
-            data_formatted["origin_date"].append(origin_date)
-            data_formatted["target"].append(target)
-            data_formatted["horizon"].append(index + 1)
-            data_formatted["target_end_date"].append(pd.to_datetime(last_date) + timedelta(days=7 * int(index + 1)))
-            data_formatted["location"].append(location)
-            data_formatted["output_type"].append("quantile")
-            data_formatted["output_type_id"].append("{:.3f}".format(quantile))
-            data_formatted["value"].append(row[str(quantile)])
-
-        # add median 
-        data_formatted["origin_date"].append(origin_date)
-        data_formatted["target"].append(target)
-        data_formatted["horizon"].append(index + 1)
-        data_formatted["target_end_date"].append(pd.to_datetime(last_date) + timedelta(days=7 * int(index + 1)))
-        data_formatted["location"].append(location)
-        data_formatted["output_type"].append("median")
-        data_formatted["output_type_id"].append("")
-        data_formatted["value"].append(row[str(0.5)])
-
-    df_quantile_formatted = pd.DataFrame(data=data_formatted)
+    return format_data_locations([df_quantile], 
+                                 locations=[location], 
+                                 target=target, 
+                                 last_date=last_date, 
+                                 origin_date=origin_date, 
+                                 quantiles=quantiles)
+
+
+def format_data_locations(df_quantiles, 
+                          locations, 
+                          target,
+                          last_date,
+                          origin_date, 
+                          quantiles=[0.010, 0.025, 0.050, 0.100, 0.150, 0.200, 0.250, 0.300, 0.350, 0.400, 0.450, 0.500, 
+                                     0.550, 0.600, 0.650, 0.700, 0.750, 0.800, 0.850, 0.900, 0.950, 0.975, 0.990]):
+    """
+    Format the quantiles of several locations into a single submission frame.
+
+    Each location contributes, for every horizon, one row per quantile followed by the median row.
+
+    Parameters:
+    - df_quantiles (list): quantiles tables (as returned by compute_quantiles), one per location.
+    - locations (list): location codes, in the same order as df_quantiles.
+    - target (str): target name.
+    - last_date (datetime): date of the last truth data.
+    - origin_date (str): forecast origin date.
+    - quantiles (list): quantile levels to submit.
+
+    Returns:
+    - pd.DataFrame: formatted forecasts.
+    """
+
+    # output columns of a single horizon: the quantiles and the median
+    columns = [str(quantile) for quantile in quantiles] + [str(0.5)]
+    output_type = np.array(["quantile"] * len(quantiles) + ["median"], dtype=object)
+    output_type_id = np.array(["{:.3f}".format(quantile) for quantile in quantiles] + [""], dtype=object)
+    n_outputs = len(columns)
+
+    # preallocate all the rows
+    n_rows = sum(len(df_quantile) for df_quantile in df_quantiles) * n_outputs
+    values = np.empty(n_rows)
+    horizons = np.empty(n_rows, dtype=np.int64)
+    location_values = np.empty(n_rows, dtype=object)
+
+    row = 0
+    for df_quantile, location in zip(df_quantiles, locations):
+        block = df_quantile[columns].to_numpy()
+        values[row:row + block.size] = block.ravel()
+        horizons[row:row + block.size] = np.repeat(df_quantile.index.values + 1, n_outputs)
+        location_values[row:row + block.size] = location
+        row += block.size
+
+    # one date computation per horizon
+    unique_horizons = np.unique(horizons)
+    horizon_dates = pd.to_datetime(last_date) + pd.to_timedelta(7 * unique_horizons, unit="D")
+
+    df_quantile_formatted = pd.DataFrame(data=dict(origin_date=origin_date,
+                                                   target=target,
+                                                   horizon=horizons,
+                                                   target_end_date=horizon_dates[np.searchsorted(unique_horizons, horizons)],
+                                                   location=location_values,
+                                                   output_type=np.tile(output_type, n_rows // n_outputs),
+                                                   output_type_id=np.tile(output_type_id, n_rows // n_outputs),
+                                                   value=values))
     return df_quantile_formatted
 
 
-def generate_baseline_forecast_fullpipeline(truth_data, 
-                                            forecasting_weeks,
-                                            target_name="ILI incidence", 
-                                            nsamples=10000,
-                                            horizon=4,
-                                            symmetrize=True): 
+def forecast_location(data : np.ndarray, 
+                      location : str, 
+                      target_name : str, 
+                      origin_date : str, 
+                      nsamples : int, 
+                      horizon : int, 
+                      extra_horizon : int = 0, 
+                      symmetrize : bool = True, 
+                      seed : int = None, 
+                      engine : str = "sampling") -> pd.DataFrame:
+    """
+    Compute the baseline quantiles of a single (target, location) forecast.
+
+    Parameters:
+    - data (np.ndarray): training data, sorted by date.
+    - location (str): location code.
+    - target_name (str): target name.
+    - origin_date (str): forecast origin date.
+    - nsamples (int): number of forecasting samples.
+    - horizon (int): forecasting horizon in steps.
+    - extra_horizon (int): steps between the last training data and the forecast start. (Defaults to 0).
+    - symmetrize (bool): if True one-step differences are symmetrized. (Defaults to True).
+    - seed (int): global seed of the run, if None the global numpy random state is used. (Defaults to None).
+    - engine (str): "sampling" or "exact". (Defaults to "sampling").
+
+    Returns:
+    - pd.DataFrame: quantiles table for the forecast horizons.
+    """
+
+    if engine == "exact":
+        # quantiles of the exact forecast distribution
+        df_quantile = exact_quantiles(data=data, horizon=horizon + extra_horizon, symmetrize=symmetrize)
+
+        # remove extra horizons data
+        return df_quantile.iloc[-horizon:].reset_index(drop=True)
+
+    # one independent random stream per forecast when the run is seeded
+    rng = None if seed is None else location_rng(seed, target_name, location, origin_date)
+
+    # generate baseline forecast samples
+    samples = quantile_baseline(data=data, nsamples=nsamples, horizon=horizon + extra_horizon, symmetrize=symmetrize, include_training=False, rng=rng)
+
+    # remove extra horizons data
+    samples = samples[:, -horizon:]
+    
+    # generate quantiles
+    return compute_quantiles(samples)
+
+
+def prepare_baseline_jobs(truth_data, 
+                          forecasting_weeks,
+                          target_name="ILI incidence", 
+                          nsamples=10000,
+                          horizon=4,
+                          symmetrize=True, 
+                          seed=None, 
+                          engine="sampling"):
+    """
+    Split the truth data of a target into one forecast_location job per location.
+
+    Returns:
+    - tuple: list of jobs (forecast_location keyword arguments), last truth date and origin date.
+    """
     
     # get last truth date
     last_date = datetime.strptime(forecasting_weeks.target_end_date.min(), "%Y-%m-%d") - timedelta(days=7)
@@ -158,10 +383,9 @@ def generate_baseline_forecast_fullpipeline(truth_data,
     # import forecasting weeks 
     origin_date = forecasting_weeks.origin_date.values[0]
 
-    quantile_baseline_forecasts = pd.DataFrame()
+    jobs = []
 
-    for location in truth_data.location.unique(): 
-        truth_data_loc = truth_data.loc[truth_data.location == location]
+    for location, truth_data_loc in truth_data.groupby("location", sort=False): 
         # sort data
         truth_data_loc = truth_data_loc.sort_values(by="truth_date", ascending=True, ignore_index=True)
 
@@ -180,61 +404,302 @@ def generate_baseline_forecast_fullpipeline(truth_data,
             print(f"Warning: skipping location {location} due to data gap of {extra_horizon} weeks (threshold: 4)")
             continue
         ####
-        
-        # generate baseline forecast samples
-        samples = quantile_baseline(data=truth_data_loc.value.values, nsamples=nsamples, horizon=horizon + extra_horizon, symmetrize=symmetrize, include_training=False)
 
-        # remove extra horizons data
-        samples = samples[:, -horizon:]
-        
-        # generate quantiles
-        df_quantile = compute_quantiles(samples)
+        # each job only carries its own slice of the truth data
+        jobs.append(dict(data=truth_data_loc.value.values, 
+                         location=location, 
+                         target_name=target_name, 
+                         origin_date=origin_date, 
+                         nsamples=nsamples, 
+                         horizon=horizon, 
+                         extra_horizon=extra_horizon, 
+                         symmetrize=symmetrize, 
+                         seed=seed, 
+                         engine=engine))
 
-        # format data 
-        df_quantile_formatted = format_data(df_quantile, location=location, target=target_name, last_date=last_date, origin_date=origin_date)
-        
-        quantile_baseline_forecasts = pd.concat((quantile_baseline_forecasts, df_quantile_formatted))
+    return jobs, last_date, origin_date
+
+
+def job_cache_key(job):
+    """
+    Get the cache key of a forecast_location job.
+
+    The key covers the forecast identifiers, a hash of the truth series and all the parameters 
+    the quantiles depend on. Unseeded sampling jobs are not reproducible and are never cached.
+
+    Returns:
+    - str: cache key, or None if the job can not be cached.
+    """
+
+    if job["engine"] != "exact" and job["seed"] is None:
+        return None
+
+    truth_hash = hashlib.sha256(np.ascontiguousarray(job["data"], dtype=float).tobytes()).hexdigest()
+    key = [job["target_name"], job["location"], truth_hash, job["origin_date"], job["horizon"], job["extra_horizon"], 
+           job["nsamples"], job["seed"], job["symmetrize"], job["engine"]]
+
+    return hashlib.sha256(json.dumps(key, default=str).encode("utf-8")).hexdigest()
+
+
+def job_cache_dir(cache_dir, job):
+    """
+    Cache folder of a forecast_location job: one subfolder per target.
+    """
+
+    return os.path.join(cache_dir, str(job["target_name"]).replace(" ", "_"))
+
+
+def load_cached_quantiles(cache_dir, key):
+    """
+    Load a quantiles table from the cache.
+
+    Returns:
+    - pd.DataFrame: cached quantiles table, or None if missing.
+    """
+
+    cache_file = os.path.join(cache_dir, f"{key}.npy")
+    if not os.path.exists(cache_file):
+        return None
+
+    _, columns = quantile_columns(np.arange(0.01, 1.0, 0.01))
+    values = np.load(cache_file)
+    if values.ndim != 2 or values.shape[1] != len(columns):
+        return None
+
+    return pd.DataFrame(values, columns=columns)
+
+
+def store_cached_quantiles(cache_dir, key, df_quantile):
+    """
+    Store a quantiles table in the cache.
+    """
+
+    cache_file = os.path.join(cache_dir, f"{key}.npy")
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+
+    with open(tmp_file, "wb") as fcache:
+        np.save(fcache, df_quantile.to_numpy())
+    os.replace(tmp_file, cache_file)
+
+
+def run_baseline_jobs(jobs, workers=1, cache_dir=None):
+    """
+    Run forecast_location jobs, serially or on a pool of worker processes.
+
+    Results are returned in the order of the jobs. Sampling jobs of an unseeded run get a 
+    fresh common seed when run in parallel, so that forked workers do not share the 
+    global random state.
+
+    If cache_dir is given, the quantiles of the reproducible jobs are looked up in the cache 
+    (see job_cache_key, one subfolder per target) and only the missing ones are computed. 
+    Cache entries of the targets of the run not used by the run are removed, so the cache only 
+    holds the latest run of each target.
+
+    Returns:
+    - list: quantiles tables, one per job.
+    """
+
+    df_quantiles = [None] * len(jobs)
+    keys = [None] * len(jobs)
+    cache_dirs = [None] * len(jobs)
+
+    if cache_dir is not None:
+        cache_dirs = [job_cache_dir(cache_dir, job) for job in jobs]
+        for target_cache_dir in set(cache_dirs):
+            os.makedirs(target_cache_dir, exist_ok=True)
+        keys = [job_cache_key(job) for job in jobs]
+        df_quantiles = [None if key is None else load_cached_quantiles(cache_dirs[i], key) for i, key in enumerate(keys)]
+        print (f"Baseline cache: {sum(df is not None for df in df_quantiles)} of {len(jobs)} forecasts cached")
+
+    pending = [i for i, df_quantile in enumerate(df_quantiles) if df_quantile is None]
+
+    if workers <= 1:
+        results = [forecast_location(**jobs[i]) for i in pending]
+
+    else:
+        run_seed = np.random.SeedSequence().entropy
+        pending_jobs = [dict(jobs[i], seed=run_seed) if jobs[i]["seed"] is None else jobs[i] for i in pending]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(forecast_location, **job) for job in pending_jobs]
+            results = [future.result() for future in futures]
+
+    for i, df_quantile in zip(pending, results):
+        df_quantiles[i] = df_quantile
+        if keys[i] is not None:
+            store_cached_quantiles(cache_dirs[i], keys[i], df_quantile)
+
+    if cache_dir is not None:
+        # drop the entries of previous runs, only for the targets of this run
+        for target_cache_dir in set(cache_dirs):
+            used_files = {f"{key}.npy" for key, job_dir in zip(keys, cache_dirs) if key is not None and job_dir == target_cache_dir}
+            for cache_file in os.listdir(target_cache_dir):
+                if cache_file.endswith(".npy") and cache_file not in used_files:
+                    os.remove(os.path.join(target_cache_dir, cache_file))
+
+    return df_quantiles
+
+
+def generate_baseline_forecast_fullpipeline(truth_data, 
+                                            forecasting_weeks,
+                                            target_name="ILI incidence", 
+                                            nsamples=10000,
+                                            horizon=4,
+                                            symmetrize=True, 
+                                            seed=None, 
+                                            engine="sampling", 
+                                            workers=1): 
+    
+    jobs, last_date, origin_date = prepare_baseline_jobs(truth_data, 
+                                                         forecasting_weeks, 
+                                                         target_name=target_name, 
+                                                         nsamples=nsamples, 
+                                                         horizon=horizon, 
+                                                         symmetrize=symmetrize, 
+                                                         seed=seed, 
+                                                         engine=engine)
+
+    df_quantiles = run_baseline_jobs(jobs, workers=workers)
+
+    # format data 
+    quantile_baseline_forecasts = format_data_locations(df_quantiles, 
+                                                        locations=[job["location"] for job in jobs], 
+                                                        target=target_name, 
+                                                        last_date=last_date, 
+                                                        origin_date=origin_date)
         
     return quantile_baseline_forecasts, origin_date
 
 
-# import forecasting weeks
-forecasting_weeks = import_forecasting_weeks(args.hub_path)
+def import_target_data(hub_path, target):
+    """
+    Import the latest truth data of a target from all the data sources.
 
-target_data_combo = pd.DataFrame()
-origin_date_combo = ''
+    Parameters:
+    - hub_path (str): hub root path.
+    - target (str): target name, as in the truth file names (e.g. ILI_incidence).
 
-for target in targets:
-    print (f'### Target: {target}')
-    
-    # import target data from all sources
-    target_data = pd.DataFrame()
+    Returns:
+    - pd.DataFrame: truth data of all the sources, cut at the start of the historical window.
+    """
+
+    target_sources = []
 
     for source in data_sources:
         print (f'### Source: {source}')
-        file_path = os.path.join(args.hub_path, f"target-data/{source}/latest-{target}.csv")
+        file_path = os.path.join(hub_path, f"target-data/{source}/latest-{target}.csv")
         if os.path.exists(file_path):
-            target_source = pd.read_csv(file_path)
-            target_data = pd.concat((target_data, target_source), ignore_index=True)
+            target_sources.append(pd.read_csv(file_path))
 
+    target_data = pd.concat(target_sources, ignore_index=True)
 
     # cut historical data
-    target_data = target_data.loc[target_data.year_week >= "2023-W42"].reset_index(drop=True)
-
-    quantile_baseline_forecasts, origin_date = generate_baseline_forecast_fullpipeline(target_data, 
-                                                                      target_name=target.replace("_", " "), 
-                                                                      nsamples=int(args.nsamples),
-                                                                      horizon=int(args.horizon),
-                                                                      symmetrize=bool(args.symmetrize), 
-                                                                      forecasting_weeks=forecasting_weeks)
-    
-    target_data_combo = pd.concat((target_data_combo, quantile_baseline_forecasts))
-    origin_date_combo = origin_date
+    return target_data.loc[target_data.year_week >= "2023-W42"].reset_index(drop=True)
+
+
+def run_baseline(hub_path, 
+                 targets=["ILI_incidence", "ARI_incidence"], 
+                 nsamples=10000, 
+                 horizon=4, 
+                 symmetrize=True, 
+                 seed=None, 
+                 engine="sampling", 
+                 workers=1, 
+                 team_abbr="respicast", 
+                 model_abbr="quantileBaseline", 
+                 cache_dir=None):
+    """
+    Generate the baseline forecasts of all the targets of a hub and save them to its model-output folder.
 
-model_id = f"{str(args.team_abbr)}-{str(args.model_abbr)}"
-file_name = f"{origin_date_combo}-{model_id}.csv"
-target_data_combo.to_csv(os.path.join(args.hub_path, f"model-output/{model_id}/{file_name}"), index=False)
+    cache_dir, if given, is the folder of the per-location quantiles cache (relative to the hub root), 
+    e.g. .github/baseline-cache.
 
-env_file = os.getenv('GITHUB_OUTPUT')
-with open(env_file, "a") as outenv:
-   outenv.write (f"baseline_file=model-output/{model_id}/{file_name}")
+    Returns:
+    - str: path of the baseline file, relative to the hub root.
+    """
+
+    # import forecasting weeks
+    forecasting_weeks = import_forecasting_weeks(hub_path)
+
+    target_jobs = []
+    origin_date_combo = ''
+
+    for target in targets:
+        print (f'### Target: {target}')
+        
+        # import target data from all sources
+        target_data = import_target_data(hub_path, target)
+
+        jobs, last_date, origin_date = prepare_baseline_jobs(target_data, 
+                                                             target_name=target.replace("_", " "), 
+                                                             nsamples=nsamples,
+                                                             horizon=horizon,
+                                                             symmetrize=symmetrize, 
+                                                             seed=seed, 
+                                                             engine=engine, 
+                                                             forecasting_weeks=forecasting_weeks)
+        
+        target_jobs.append((target, jobs, last_date, origin_date))
+        origin_date_combo = origin_date
+
+    # run the (target, location) jobs of all the targets together 
+    df_quantiles = run_baseline_jobs([job for _, jobs, _, _ in target_jobs for job in jobs], 
+                                     workers=workers, 
+                                     cache_dir=None if cache_dir is None else os.path.join(hub_path, cache_dir))
+
+    target_forecasts = []
+    for target, jobs, last_date, origin_date in target_jobs:
+        target_quantiles, df_quantiles = df_quantiles[:len(jobs)], df_quantiles[len(jobs):]
+
+        # format data 
+        target_forecasts.append(format_data_locations(target_quantiles, 
+                                                      locations=[job["location"] for job in jobs], 
+                                                      target=target.replace("_", " "), 
+                                                      last_date=last_date, 
+                                                      origin_date=origin_date))
+
+    model_id = f"{str(team_abbr)}-{str(model_abbr)}"
+    file_name = f"{origin_date_combo}-{model_id}.csv"
+    target_data_combo = pd.concat(target_forecasts)
+    target_data_combo.to_csv(os.path.join(hub_path, f"model-output/{model_id}/{file_name}"), index=False)
+
+    return f"model-output/{model_id}/{file_name}"
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hub_path')
+    parser.add_argument('--targets', default= 'ILI_incidence ARI_incidence')
+    parser.add_argument('--symmetrize', default=True)
+    parser.add_argument('--nsamples', default=10000)
+    parser.add_argument('--horizon', default=4)
+    parser.add_argument('--team_abbr', default="respicast")
+    parser.add_argument('--model_abbr', default="quantileBaseline")
+    parser.add_argument('--submission_end_weekday', default=2)
+    parser.add_argument('--seed', default=None)
+    parser.add_argument('--engine', default="sampling", choices=["sampling", "exact"])
+    parser.add_argument('--workers', default=1)
+    parser.add_argument('--cache_dir', default=None)
+
+    args = parser.parse_args(argv)
+
+    baseline_file = run_baseline(args.hub_path, 
+                                 targets=args.targets.split(' '), 
+                                 nsamples=int(args.nsamples), 
+                                 horizon=int(args.horizon), 
+                                 symmetrize=bool(args.symmetrize), 
+                                 seed=None if args.seed is None else int(args.seed), 
+                                 engine=args.engine, 
+                                 workers=int(args.workers), 
+                                 team_abbr=args.team_abbr, 
+                                 model_abbr=args.model_abbr, 
+                                 cache_dir=args.cache_dir)
+
+    env_file = os.getenv('GITHUB_OUTPUT')
+    with open(env_file, "a") as outenv:
+       outenv.write (f"baseline_file={baseline_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import argparse
 import os
-import json
+import data_storage as ds
 from datetime import datetime
 
 DELTA_DAYS = 3
@@ -8,31 +8,12 @@ DELTA_DAYS = 3
 #
 #
 def read_jbd():
-    db_path = os.path.join(os.getcwd(), "./repo/.github/data-storage/import_truth_db.json")
-    j_data = {}
-
-     # Step 1: Read the existing data from the JSON file
-    try:
-        with open (db_path, 'r') as fdb:
-            j_data = json.load(fdb)            
-
-    except FileNotFoundError:
-        # If the file doesn't exist, handle error
-        raise Exception(f"Json db file not found {db_path}\n")
-
-    return j_data
+    return ds.get_storage().read("import_truth_db.json")
 
 #
 #
 def write_jdb(j_data):
-    db_path = os.path.join(os.getcwd(), "./repo/.github/data-storage/import_truth_db.json")
-
-    try:
-        with open(db_path, 'w') as fdb:
-            json.dump(j_data, fdb, indent=4)
-    except:
-        # If the file doesn't exist, handle error
-        raise Exception(f"Error writing  {j_data} \n to json file: {db_path}\n")
+    ds.get_storage().set_records("import_truth_db.json", j_data)
 
 
 #
@@ -44,10 +25,7 @@ def persist_import(source, reference):
     update['last_import'] = datetime.now().strftime("%Y-%m-%d") # current date and time
     update['reference_date'] = reference
 
-    json_data = read_jbd()
-
-    json_data[source] = update    
-    write_jdb (json_data)
+    write_jdb ({source: update})
 
 #
 #
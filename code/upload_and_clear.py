@@ -3,6 +3,7 @@ import json
 import shutil
 import argparse 
 import requests
+from requests.adapters import HTTPAdapter
 import hmac
 import hashlib
 
@@ -38,14 +39,23 @@ class Sender () :
     self.webhook_url = webhook_url
     print (f'sending data to {self.webhook_url}')
 
+    # keep-alive session: all the posts reuse the pooled connection to the webhook
+    self.session = requests.Session()
+    self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+    self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
 
   def send (self, payload, secret):
     # send POST request 
-    r = requests.post(self.webhook_url, data=payload, auth=BodyDigestSignature(secret))
+    r = self.session.post(self.webhook_url, data=payload, auth=BodyDigestSignature(secret))
 
     return r
 
 
+  def close (self):
+    self.session.close()
+
+
 #
 #
 def handleResponseOK():
@@ -140,19 +150,24 @@ def post_files(changes, whurl, whsecret, disease_name):
     # order input 
     changes.sort()
 
-    for change in changes:
-      
-        jpayload["changes"] = [change]
-        sender_obj = Sender (whurl)
-        response = sender_obj.send(json.dumps(jpayload), whsecret)
-        # response = response_gen()
+    # one sender for all the posts, sent one at a time in order: the ingestion stops at the first failure
+    sender_obj = Sender (whurl)
+
+    try:
+        for change in changes:
+          
+            jpayload["changes"] = [change]
+            response = sender_obj.send(json.dumps(jpayload), whsecret)
+            # response = response_gen()
 
-        if not response.headers["content-type"].strip().startswith("application/json"):
-            return handleServerError()
+            if not response.headers["content-type"].strip().startswith("application/json"):
+                return handleServerError()
 
-        if response.status_code != 200:
-            print(f"Failed to post {change}, Status Code: {response.status_code}")
-            return handleResponseError(response.status_code, response.json())
+            if response.status_code != 200:
+                print(f"Failed to post {change}, Status Code: {response.status_code}")
+                return handleResponseError(response.status_code, response.json())
+    finally:
+        sender_obj.close()
        
     return handleResponseOK()
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the workflow scripts import each other as siblings of the code folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code"))
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+import change_router as cr
+
+
+def legacy_forecast_route(path):
+    """
+    Routing of persist_changes/store_changes before the route table.
+    """
+    if path.startswith("model-output/respicast-hubEnsemble/") or path.startswith("model-output/respicast-quantileBaseline/"):
+        return "ensemble"
+    elif path.startswith("model-output"):
+        return "model"
+    elif path.startswith("model-metadata"):
+        return "metadata"
+    elif path.startswith("target-data") and not 'latest-' in path:
+        return "target"
+    elif path.startswith("model-evaluation") and not 'latest-' in path:
+        return "evaluation"
+    return cr.unknown_bucket
+
+
+def legacy_scenario_route(path):
+    """
+    Routing of SH_persist_changes before the route table.
+    """
+    if path.startswith("model-output"):
+        return "model"
+    elif path.startswith("model-metadata"):
+        return "metadata"
+    elif path.startswith("target-data") and not 'latest-' in path:
+        return "target"
+    return cr.unknown_bucket
+
+
+paths = ["model-output/respicast-hubEnsemble/2024-12-04-respicast-hubEnsemble.csv", 
+         "model-output/respicast-quantileBaseline/2024-12-04-respicast-quantileBaseline.csv", 
+         "model-output/respicast-hubEnsembleX/2024-12-04-respicast-hubEnsembleX.csv", 
+         "model-output/respicast-hubEnsemble", 
+         "model-output/team-model/2024-12-04-team-model.parquet", 
+         "model-metadata/team-model.yml", 
+         "target-data/ERVISS/snapshots/2024-12-06-ILI_incidence.csv", 
+         "target-data/ERVISS/latest-ILI_incidence.csv", 
+         "target-data/FluID/snapshots/2024-12-06-latest-ILI_incidence.csv", 
+         "model-evaluation/snapshots/2024-12-11-forecast_scores.csv", 
+         "model-evaluation/latest-forecast_scores.csv", 
+         "README.md", 
+         "hub-config/tasks.json", 
+         "supporting-files/forecasting_weeks.csv", 
+         ""]
+
+
+@pytest.mark.parametrize("routes, legacy_route", [(cr.forecast_routes, legacy_forecast_route), 
+                                                  (cr.scenario_routes, legacy_scenario_route)])
+def test_routes_match_legacy_routing(routes, legacy_route):
+    buckets = cr.ChangeRouter(routes).classify(paths)
+
+    expected = {}
+    for path in paths:
+        expected.setdefault(legacy_route(path), []).append(path)
+
+    assert {bucket: bucket_paths for bucket, bucket_paths in buckets.items() if bucket_paths} == expected
+
+
+def test_load_router_from_hub_config(tmp_path):
+    routes_file = tmp_path / "change-routes.json"
+    with open(routes_file, "w") as froutes:
+        json.dump({"routes": [{"bucket": "model", "pattern": "model-output/[^/]+/"}, 
+                              {"bucket": "target", "prefix": "target-data", "exclude": "latest-"}]}, froutes)
+
+    buckets = cr.load_router(cr.forecast_routes, str(routes_file)).classify(paths)
+
+    assert buckets["model"] == [path for path in paths if path.startswith("model-output/") and path.count("/") > 1]
+    assert buckets["target"] == paths[6:7]
+    assert "metadata" not in buckets and "model-metadata/team-model.yml" in buckets[cr.unknown_bucket]
+
+
+def test_load_router_rejects_unknown_buckets(tmp_path):
+    routes_file = tmp_path / "change-routes.json"
+    with open(routes_file, "w") as froutes:
+        json.dump({"routes": [{"bucket": "model", "prefix": "model-output"}, {"bucket": "ensembles", "prefix": "ensemble-output"}]}, froutes)
+
+    with pytest.raises(Exception, match="ensembles"):
+        cr.load_router(cr.forecast_routes, str(routes_file))
+
+    # evaluation is not stored by SH_persist_changes
+    with open(routes_file, "w") as froutes:
+        json.dump({"routes": [{"bucket": "evaluation", "prefix": "model-evaluation"}]}, froutes)
+
+    with pytest.raises(Exception, match="evaluation"):
+        cr.load_router(cr.scenario_routes, str(routes_file))
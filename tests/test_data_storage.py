@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+import data_storage as ds
+
+
+def test_sqlite_compact_failure_keeps_rows(tmp_path, monkeypatch):
+    storage = ds.SqliteStorage(str(tmp_path))
+    paths = ["model-evaluation/snapshots/2024-01-05-forecast_scores.csv",
+             "model-evaluation/snapshots/2024-01-12-forecast_scores.csv"]
+    storage.add_changes("evaluation_db.json", paths)
+
+    def failing_import(db, json_data):
+        storage.insert_changes(db, json_data["changes"][:1])
+        raise RuntimeError("import failed")
+
+    monkeypatch.setattr(storage, "import_json", failing_import)
+
+    with pytest.raises(RuntimeError):
+        storage.compact("evaluation_db.json")
+
+    assert storage.read("evaluation_db.json") == {"changes": paths}
+
+
+def test_sqlite_compact_without_json_export(tmp_path):
+    storage = ds.SqliteStorage(str(tmp_path))
+    storage.add_changes("evaluation_db.json", ["a.csv", "b.csv"])
+
+    assert storage.exists("evaluation_db.json")
+    assert not storage.exists("metadata_db.json")
+    assert storage.compact("evaluation_db.json") == (2, 2)
+
+    with open(tmp_path / "evaluation_db.json") as fdb:
+        assert json.load(fdb) == {"changes": ["a.csv", "b.csv"]}
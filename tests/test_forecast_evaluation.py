@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecast_evaluation as fev
+import format_evaluation_file as fe
+
+# columns of the forecast_scores_summary.csv written by the R scoring
+r_summary_columns = ['model', 'origin_date', 'target', 'target_end_date', 'horizon', 'location', 'interval_score', 
+                     'dispersion', 'underprediction', 'overprediction', 'coverage_deviation', 'bias', 'ae_median']
+
+
+def quantile_forecast(quantiles, predictions, true_value, model="team-model", location="IT"):
+    return pd.DataFrame(dict(model=model, origin_date="2024-12-04", target="ILI incidence", target_end_date="2024-12-08", 
+                             horizon=1, location=location, quantile=quantiles, prediction=predictions, true_value=true_value))
+
+
+def naive_scores(df_forecasts):
+    """
+    scoringutils 1.x scores (range format, then mean over the rows of each forecast), one quantile row at a time.
+    """
+    rows = []
+    for unit, df_unit in df_forecasts.groupby(fev.forecast_unit):
+        quantiles = df_unit["quantile"].astype(float).values
+        predictions = df_unit["prediction"].values
+        true_value = df_unit["true_value"].values[0]
+
+        components = []
+        for level in quantiles:
+            interval_range = abs(1 - 2 * level)
+            lower = predictions[np.isclose(quantiles, min(level, 1 - level))][0]
+            upper = predictions[np.isclose(quantiles, max(level, 1 - level))][0]
+            alpha = 1 - interval_range
+            dispersion = alpha / 2 * (upper - lower)
+            overprediction = (lower - true_value) * (true_value < lower)
+            underprediction = (true_value - upper) * (true_value > upper)
+            coverage_deviation = float(lower <= true_value <= upper) - interval_range
+            components.append((dispersion + overprediction + underprediction, dispersion, underprediction, overprediction, coverage_deviation))
+
+        median = predictions[np.isclose(quantiles, 0.5)][0]
+        if true_value == median:
+            bias = 0.
+        elif true_value < median:
+            bias = 1. if true_value < predictions.min() else 1 - 2 * quantiles[predictions <= true_value].max()
+        else:
+            bias = -1. if true_value > predictions.max() else 1 - 2 * quantiles[predictions >= true_value].min()
+
+        rows.append(list(unit) + list(np.mean(components, axis=0)) + [bias, abs(true_value - median)])
+
+    return pd.DataFrame(rows, columns=r_summary_columns)
+
+
+def test_score_quantiles_known_values():
+    df_summary = fev.score_quantiles(quantile_forecast([0.25, 0.5, 0.75], [1., 2., 3.], 5.))
+
+    assert list(df_summary.columns) == r_summary_columns
+    assert len(df_summary) == 1
+    assert df_summary.interval_score[0] == pytest.approx(8 / 3)
+    assert df_summary.dispersion[0] == pytest.approx(1 / 3)
+    assert df_summary.underprediction[0] == pytest.approx(7 / 3)
+    assert df_summary.overprediction[0] == 0.
+    assert df_summary.ae_median[0] == 3.
+    assert df_summary.bias[0] == -1.
+
+
+def test_score_quantiles_matches_naive_scores():
+    rng = np.random.default_rng(3)
+    quantiles = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.975, 0.99]
+
+    df_forecasts = pd.concat([quantile_forecast(quantiles, np.sort(rng.normal(50, 20, len(quantiles))), true_value, 
+                                                model=f"team{i % 3}-model", location=f"L{i:02d}")
+                              # true values below, inside and above the predictions, and equal to the median
+                              for i, true_value in enumerate(rng.normal(50, 40, 60))], ignore_index=True)
+    df_forecasts.loc[df_forecasts.location == "L00", "true_value"] = df_forecasts.loc[(df_forecasts.location == "L00") & (df_forecasts["quantile"] == 0.5), "prediction"].values[0]
+
+    # rows in random order
+    df_summary = fev.score_quantiles(df_forecasts.sample(frac=1, random_state=1))
+    df_naive = naive_scores(df_forecasts)
+
+    keys = fev.forecast_unit
+    pd.testing.assert_frame_equal(df_summary.sort_values(keys, ignore_index=True), df_naive.sort_values(keys, ignore_index=True), 
+                                  check_dtype=False, rtol=1e-12)
+
+
+def test_score_quantiles_output_is_formatted(tmp_path):
+    df_forecasts = pd.concat([quantile_forecast([0.25, 0.5, 0.75], [1., 2., 3.], 2.5, model=model) 
+                              for model in ["respicast-quantileBaseline", "team-model"]], ignore_index=True)
+
+    # through the summary csv, as read by format_evaluation_file.main
+    summary_path = tmp_path / "forecast_scores_summary.csv"
+    fev.score_quantiles(df_forecasts).to_csv(summary_path, index=False)
+    df_scores = fe.format_scores(pd.read_csv(summary_path), "respicast", "quantileBaseline")
+
+    assert len(df_scores) == 4
+    assert set(df_scores.metric) == {"WIS", "AE"}
+
+
+@pytest.mark.parametrize("quantiles, predictions", [
+    # duplicated median (e.g. duplicated truth rows)
+    ([0.25, 0.5, 0.5, 0.75], [1., 2., 2., 3.]), 
+    # duplicated quantile row
+    ([0.25, 0.25, 0.5, 0.75, 0.75], [1., 1., 2., 3., 3.])])
+def test_score_quantiles_duplicated_levels(quantiles, predictions):
+    with pytest.raises(Exception, match="duplicated quantile levels"):
+        fev.score_quantiles(quantile_forecast(quantiles, predictions, 5.))
+
+
+def test_score_quantiles_missing_median():
+    with pytest.raises(Exception, match="median"):
+        fev.score_quantiles(quantile_forecast([0.25, 0.75], [1., 3.], 5.))
@@ -0,0 +1,122 @@
+import os
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import format_evaluation_file as fe
+
+summary_columns = ['model', 'origin_date', 'target', 'target_end_date', 'horizon', 'location', 'interval_score', 
+                   'dispersion', 'underprediction', 'overprediction', 'coverage_deviation', 'bias', 'ae_median']
+
+
+@pytest.fixture
+def hub_path(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / "model-evaluation" / "snapshots")
+    monkeypatch.setenv("GITHUB_OUTPUT", str(tmp_path / "github_output.txt"))
+    return tmp_path
+
+
+def write_summary(hub_path, rows):
+    pd.DataFrame(rows, columns=summary_columns).to_csv(hub_path / "model-evaluation" / "forecast_scores_summary.csv", index=False)
+
+
+def summary_rows():
+    return [[model, origin_date, "ILI incidence", "2024-12-08", 1, "IT", value, 1., 1., 1., 0.1, 0.1, value]
+            for origin_date in ["2024-11-27", "2024-12-04"]
+            for model, value in [("respicast-quantileBaseline", 10.), ("team-model", 5.)]]
+
+
+def test_fingerprints_written_only_when_incremental(hub_path):
+    write_summary(hub_path, summary_rows())
+    fingerprints_path = hub_path / "model-evaluation" / "latest-forecast_scores_fingerprints.json"
+
+    fe.main(["--hub_path", str(hub_path)])
+    assert os.path.exists(hub_path / "model-evaluation" / "latest-forecast_scores.csv")
+    assert not os.path.exists(fingerprints_path)
+
+    fe.main(["--hub_path", str(hub_path), "--incremental"])
+    assert os.path.exists(fingerprints_path)
+
+
+def test_write_scores_parquet_replaces_dataset(hub_path):
+    pytest.importorskip("pyarrow")
+    write_summary(hub_path, summary_rows())
+    df_scores = fe.format_scores(pd.read_csv(hub_path / "model-evaluation" / "forecast_scores_summary.csv"), "respicast", "quantileBaseline")
+    dataset_path = str(hub_path / "model-evaluation" / "latest-forecast_scores")
+
+    fe.write_scores_parquet(df_scores, dataset_path)
+    fe.write_scores_parquet(df_scores.iloc[:1], dataset_path)
+
+    assert len(fe.read_scores(dataset_path)) == 1
+    assert sorted(os.listdir(hub_path / "model-evaluation")) == ["forecast_scores_summary.csv", "latest-forecast_scores", "snapshots"]
+
+
+@pytest.mark.parametrize("mode", [[], ["--streaming"], ["--streaming", "--pairwise_skill"], ["--streaming", "--incremental"]])
+def test_empty_summary(hub_path, mode):
+    write_summary(hub_path, [])
+
+    fe.main(["--hub_path", str(hub_path)] + mode)
+
+    df_scores = pd.read_csv(hub_path / "model-evaluation" / "latest-forecast_scores.csv")
+    assert len(df_scores) == 0
+    assert list(df_scores.columns) == fe.scores_columns + (fe.skill_columns if "--pairwise_skill" in mode else [])
+    assert os.listdir(hub_path / "model-evaluation" / "snapshots") == []
+
+
+def test_empty_summary_parquet(hub_path):
+    pytest.importorskip("pyarrow")
+    write_summary(hub_path, [])
+
+    fe.main(["--hub_path", str(hub_path), "--output_format", "both", "--streaming"])
+    fe.main(["--hub_path", str(hub_path), "--output_format", "both"])
+
+    assert not os.path.exists(hub_path / "model-evaluation" / "latest-forecast_scores")
+    with open(hub_path / "github_output.txt") as fout:
+        assert "snapshot" not in fout.read()
+
+
+def naive_relative_skill(df_group):
+    """
+    Pairwise tournament relative skill, one pair of models at a time over a model pivot.
+    """
+    pivot = df_group.pivot_table(index=fe.skill_unit_keys, columns="model", values="value_absolute", observed=True)
+    skill = {}
+    for model_i in pivot.columns:
+        log_ratios = []
+        for model_j in pivot.columns:
+            shared = pivot[model_i].notna() & pivot[model_j].notna()
+            if shared.any():
+                log_ratios.append(np.log(pivot.loc[shared, model_i].sum() / pivot.loc[shared, model_j].sum()))
+        skill[model_i] = np.exp(np.mean(log_ratios))
+    return skill
+
+
+def test_pairwise_relative_skill():
+    rng = np.random.default_rng(7)
+    rows = []
+    for target in ["ILI incidence", "ARI incidence"]:
+        # the baseline only forecasts ILI incidence
+        models = [("respicast", "quantileBaseline"), ("team_a", "model"), ("team_b", "model")] if target == "ILI incidence" \
+                 else [("team_a", "model"), ("team_b", "model")]
+        for (team_id, model_id), location, horizon in product(models, ["IT", "FR", "DE"], [1, 2]):
+            # team_b does not forecast DE
+            if team_id == "team_b" and location == "DE":
+                continue
+            rows.append(dict(origin_date="2024-12-04", target=target, target_end_date=f"2024-12-{7 * horizon:02d}", horizon=horizon, 
+                             location=location, team_id=team_id, model_id=model_id, metric="WIS", value_absolute=rng.uniform(1, 10)))
+    df_scores = pd.DataFrame(rows)
+
+    df_skill = fe.pairwise_relative_skill(df_scores, "respicast", "quantileBaseline")
+    df_skill["model"] = df_skill.team_id + "-" + df_skill.model_id
+
+    for target, df_group in df_skill.groupby("target"):
+        skill = naive_relative_skill(df_group)
+        np.testing.assert_allclose(df_group.relative_skill, df_group.model.map(skill))
+
+        if target == "ILI incidence":
+            np.testing.assert_allclose(df_group.scaled_relative_skill, df_group.model.map(skill) / skill["respicast-quantileBaseline"])
+            assert (df_group.loc[df_group.model == "respicast-quantileBaseline", "scaled_relative_skill"] == 1.).all()
+        else:
+            assert df_group.scaled_relative_skill.isna().all()
@@ -0,0 +1,95 @@
+import os
+import hashlib
+
+import numpy as np
+import pytest
+
+import benchmark_quantile_baseline as bqb
+import quantile_baseline as qb
+
+
+def sampled_quantiles(data, horizon, nsamples=400000, seed=42):
+    samples = qb.quantile_baseline(data, nsamples, horizon, include_training=False, rng=np.random.default_rng(seed))
+    return qb.compute_quantiles(samples)
+
+
+def symmetrized_diffs(data):
+    diffs = np.diff(data)
+    return np.concatenate((diffs, -diffs))
+
+
+@pytest.mark.parametrize("data, max_bins, binned", [
+    # half units: exact decimal grid, reduced by the gcd
+    (np.cumsum(np.random.default_rng(1).integers(-30, 31, 300)) * 0.5 + 2000, 1001, False), 
+    # continuous values: binned on a coarse grid
+    (np.abs(np.cumsum(np.random.default_rng(2).normal(0, 50, 300))) + 500, 101, True)])
+def test_exact_quantiles_match_sampling(data, max_bins, binned):
+    horizon = 4
+    units, step = qb.diffs_lattice(symmetrized_diffs(data), max_bins)
+    assert (units.max() - units.min() + 1 == max_bins) == binned
+    if not binned:
+        assert step == 0.5
+        np.testing.assert_allclose(units * step, symmetrized_diffs(data), atol=1e-9)
+
+    df_exact = qb.exact_quantiles(data, horizon, max_bins=max_bins)
+    df_sampled = sampled_quantiles(data, horizon)
+
+    assert list(df_exact.columns) == list(df_sampled.columns)
+    quantile_columns = df_exact.columns[:-2]
+    assert np.abs(df_exact[quantile_columns].values - df_sampled[quantile_columns].values).max() <= step + 1e-9
+
+    # the exact support contains all the samples (up to the binning of each step)
+    tolerance = horizon * step / 2 if binned else 1e-9
+    assert (df_exact["min"] <= df_sampled["min"] + tolerance).all()
+    assert (df_exact["max"] >= df_sampled["max"] - tolerance).all()
+
+
+def test_exact_quantiles_constant_series():
+    data = np.full(20, 7.)
+
+    units, step = qb.diffs_lattice(symmetrized_diffs(data), 1001)
+    assert (units == 0).all() and step > 0
+
+    df_exact = qb.exact_quantiles(data, 4)
+    assert (df_exact.values == 7.).all()
+    assert (df_exact.values == sampled_quantiles(data, 4, nsamples=1000).values).all()
+
+
+def test_exact_quantiles_missing_truth():
+    data = np.array([10., 12., np.nan, 15., 11., 13.])
+
+    df_exact = qb.exact_quantiles(data, 4)
+    assert df_exact.shape == (4, len(qb.quantile_columns(np.arange(0.01, 1.0, 0.01))[1]))
+    assert df_exact.isna().all().all()
+    assert sampled_quantiles(data, 4, nsamples=1000).isna().all().all()
+
+
+def test_golden_outputs():
+    for case, df_forecasts in bqb.golden_outputs().items():
+        assert hashlib.sha256(df_forecasts.to_csv(index=False).encode("utf-8")).hexdigest() == bqb.GOLDEN_SHA256[case], case
+
+
+def baseline_jobs(target_name, locations, seed=1):
+    truth = bqb.synthetic_truth(60, len(locations), seed)
+    return [dict(data=truth[i], location=location, target_name=target_name, origin_date=bqb.ORIGIN_DATE, nsamples=1000, 
+                 horizon=4, extra_horizon=0, symmetrize=True, seed=None, engine="exact") for i, location in enumerate(locations)]
+
+
+def test_cache_prunes_only_the_targets_of_the_run(tmp_path):
+    cache_dir = str(tmp_path)
+    ili_jobs = baseline_jobs("ILI incidence", ["IT", "FR"])
+    ari_jobs = baseline_jobs("ARI incidence", ["IT"])
+
+    qb.run_baseline_jobs(ili_jobs, cache_dir=cache_dir)
+    qb.run_baseline_jobs(ari_jobs, cache_dir=cache_dir)
+    assert len(os.listdir(tmp_path / "ILI_incidence")) == 2
+    assert len(os.listdir(tmp_path / "ARI_incidence")) == 1
+
+    # new truth data for one ILI location: its previous entry is replaced, ARI entries are kept
+    new_ili_jobs = [ili_jobs[0], dict(ili_jobs[1], data=ili_jobs[1]["data"] + 1)]
+    df_quantiles = qb.run_baseline_jobs(new_ili_jobs, cache_dir=cache_dir)
+    assert sorted(os.listdir(tmp_path / "ILI_incidence")) == sorted(f"{qb.job_cache_key(job)}.npy" for job in new_ili_jobs)
+    assert len(os.listdir(tmp_path / "ARI_incidence")) == 1
+
+    for job, df_quantile in zip(new_ili_jobs, df_quantiles):
+        assert df_quantile.equals(qb.forecast_location(**job))